@@ -0,0 +1,99 @@
+"""Numba kernels for the indicator recurrences.
+
+Without numba the kernels are left as plain Python functions; callers that
+have a vectorized fallback check NUMBA_AVAILABLE instead of running them.
+"""
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba is optional
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit that returns the function unchanged"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+# The recurrences keep the exact update order of pandas ewm(adjust=False);
+# fastmath is left off so results stay bit-identical to the scalar updates.
+
+@njit(cache=True)
+def ema_kernel(values, alpha, seed):
+    out = np.empty(values.shape[0], dtype=np.float64)
+    prev = seed
+    for i in range(values.shape[0]):
+        prev = (1.0 - alpha) * prev + alpha * values[i]
+        out[i] = prev
+    return out
+
+@njit(cache=True)
+def triple_ema_kernel(values, alphas, seeds, out):
+    """Write three EMAs of values into the rows of out, shape (3, len(values))"""
+    a0, a1, a2 = alphas[0], alphas[1], alphas[2]
+    p0, p1, p2 = seeds[0], seeds[1], seeds[2]
+    for i in range(values.shape[0]):
+        x = values[i]
+        p0 = (1.0 - a0) * p0 + a0 * x
+        p1 = (1.0 - a1) * p1 + a1 * x
+        p2 = (1.0 - a2) * p2 + a2 * x
+        out[0, i] = p0
+        out[1, i] = p1
+        out[2, i] = p2
+    return out
+
+@njit(cache=True)
+def ema_last_kernel(values, alphas):
+    """Final value of one EMA per alpha, all seeded with the first value"""
+    out = np.full(alphas.shape[0], values[0])
+    for i in range(values.shape[0]):
+        x = values[i]
+        for j in range(alphas.shape[0]):
+            out[j] = (1.0 - alphas[j]) * out[j] + alphas[j] * x
+    return out
+
+@njit(cache=True)
+def macd_kernel(close, fast_alpha, slow_alpha, signal_alpha):
+    """Final fast EMA, slow EMA and signal line of MACD"""
+    x = close[0]
+    fast = (1.0 - fast_alpha) * x + fast_alpha * x
+    slow = (1.0 - slow_alpha) * x + slow_alpha * x
+    signal = fast - slow  # The signal EMA is seeded with the first MACD value
+    signal = (1.0 - signal_alpha) * signal + signal_alpha * signal
+    for i in range(1, close.shape[0]):
+        x = close[i]
+        fast = (1.0 - fast_alpha) * fast + fast_alpha * x
+        slow = (1.0 - slow_alpha) * slow + slow_alpha * x
+        signal = (1.0 - signal_alpha) * signal + signal_alpha * (fast - slow)
+    return fast, slow, signal
+
+@njit(cache=True)
+def psar_kernel(high, low, sar, ep, af, rising, step, maximum):
+    """Run the Parabolic SAR from its state after the first bar to the last bar"""
+    prev_high, last_high = high[0], high[0]
+    prev_low, last_low = low[0], low[0]
+    for i in range(1, high.shape[0]):
+        h = high[i]
+        l = low[i]
+        sar = sar + af * (ep - sar)
+        if rising:
+            sar = min(sar, prev_low, last_low)
+            if l < sar:
+                rising = False
+                sar, ep, af = ep, l, step
+            elif h > ep:
+                ep = h
+                af = min(af + step, maximum)
+        else:
+            sar = max(sar, prev_high, last_high)
+            if h > sar:
+                rising = True
+                sar, ep, af = ep, h, step
+            elif l < ep:
+                ep = l
+                af = min(af + step, maximum)
+        prev_high, last_high = last_high, h
+        prev_low, last_low = last_low, l
+    return sar, ep, af, rising
@@ -1,23 +1,177 @@
 from alpaca.data.historical import StockHistoricalDataClient
 from alpaca.data.requests import StockBarsRequest
-from alpaca.data.timeframe import TimeFrame
-from datetime import datetime, timedelta
-import os
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+from datetime import datetime, timedelta, timezone
+import numpy as np
 import pandas as pd
-import pytz
-from typing import Dict, List, Callable
+from typing import Dict, List, Callable, Union
 import logging
 import asyncio
-import websocket
-import json
+import collections
+import websockets
+import orjson
+import msgspec
 import ssl
-import threading
+import socket
 import random
-import base64
+import time
 
 logger = logging.getLogger(__name__)
 
+# Number of bars kept per symbol for streaming updates (EMA-89 needs at least 90)
+MAX_CACHED_BARS = 500
+
+# Frames with more bars than this are converted in a worker thread
+LARGE_FRAME_BARS = 32
+
+# Schema for OHLCV frames built from historical bars
+BAR_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+BAR_DTYPES = {
+    'open': 'float64',
+    'high': 'float64',
+    'low': 'float64',
+    'close': 'float64',
+    'volume': 'int64'
+}
+
+# Maximum bars waiting to be processed; the oldest are dropped beyond this
+INBOX_SIZE = 8192
+
+# Window for coalescing subscribe requests into a single frame (seconds)
+SUBSCRIBE_FLUSH_DELAY = 0.05
+
+
+class Bar(msgspec.Struct, tag='b', tag_field='T'):
+    """Minute bar pushed by the Alpaca stream"""
+    S: str
+    t: str
+    o: float
+    h: float
+    l: float
+    c: float
+    v: float  # Integral in practice, but sometimes sent as a JSON float
+
+
+class Trade(msgspec.Struct, tag='t', tag_field='T'):
+    """Trade pushed by the Alpaca stream"""
+    S: str
+    p: float = 0.0
+    s: int = 0
+
+
+class Quote(msgspec.Struct, tag='q', tag_field='T'):
+    """Quote pushed by the Alpaca stream"""
+    S: str
+    bp: float = 0.0
+    ap: float = 0.0
+
+
+class Success(msgspec.Struct, tag='success', tag_field='T'):
+    """Control message confirming connection or authentication"""
+    msg: str = ""
+
+
+class StreamError(msgspec.Struct, tag='error', tag_field='T'):
+    """Error reported by the Alpaca stream"""
+    code: int = 0
+    msg: str = ""
+
+
+class Subscription(msgspec.Struct, tag='subscription', tag_field='T'):
+    """Acknowledgement listing the active subscriptions"""
+    trades: List[str] = []
+    quotes: List[str] = []
+    bars: List[str] = []
+
+
+StreamMessage = Union[Bar, Trade, Quote, Success, StreamError, Subscription]
+STREAM_DECODER = msgspec.json.Decoder(List[StreamMessage])
+
+
+class BarRingBuffer:
+    """Fixed-size ring buffer of OHLCV bars stored as parallel NumPy arrays"""
+    
+    __slots__ = ('size', 'timestamp', 'open', 'high', 'low', 'close', 'volume', 'head', '_frame')
+    
+    def __init__(self, size: int = MAX_CACHED_BARS):
+        self.size = size
+        self.timestamp = np.empty(size, dtype=np.int64)  # nanoseconds since epoch (UTC)
+        self.open = np.empty(size, dtype=np.float64)
+        self.high = np.empty(size, dtype=np.float64)
+        self.low = np.empty(size, dtype=np.float64)
+        self.close = np.empty(size, dtype=np.float64)
+        self.volume = np.empty(size, dtype=np.int64)
+        self.head = 0  # Total number of bars written
+        self._frame = None  # Materialized full window, valid until the next write
+    
+    def __len__(self) -> int:
+        return min(self.head, self.size)
+    
+    def extend(self, timestamps, opens, highs, lows, closes, volumes):
+        """Append bars in arrival order, overwriting the oldest once full"""
+        count = len(timestamps)
+        skip = max(count - self.size, 0)  # Bars that would be overwritten immediately
+        idx = (self.head + np.arange(skip, count)) % self.size
+        self.timestamp[idx] = timestamps[skip:]
+        self.open[idx] = opens[skip:]
+        self.high[idx] = highs[skip:]
+        self.low[idx] = lows[skip:]
+        self.close[idx] = closes[skip:]
+        self.volume[idx] = volumes[skip:]
+        self.head += count
+        self._frame = None
+    
+    def to_frame(self, count: int = None) -> pd.DataFrame:
+        """Materialize the most recent bars (oldest first) as a DataFrame.
+        
+        The full window is built once and reused until the next write.
+        Columns may be views into the buffer, so copy the result before
+        holding on to it across new bars.
+        """
+        if count is None:
+            if self._frame is None:
+                self._frame = self._build_frame(len(self))
+            return self._frame
+        return self._build_frame(min(count, len(self)))
+    
+    def _build_frame(self, count: int) -> pd.DataFrame:
+        end = self.head % self.size
+        start = end - count
+        if start >= 0:
+            order = slice(start, end)  # Contiguous, so columns are views
+        else:
+            order = np.r_[start + self.size:self.size, 0:end]
+        
+        return pd.DataFrame(
+            {
+                'open': self.open[order],
+                'high': self.high[order],
+                'low': self.low[order],
+                'close': self.close[order],
+                'volume': self.volume[order]
+            },
+            index=pd.to_datetime(self.timestamp[order], unit='ns', utc=True).rename('timestamp'),
+            copy=False
+        )
+
 class AlpacaDataManager:
+    __slots__ = (
+        'api_key', 'api_secret', 'base_url', 'ws_endpoint', 'hist_client', '_bars_pending',
+        'ws', '_ws_task', 'ws_running', '_auth_payload', '_initial_sub_payload', '_ssl_ctx',
+        '_ring', '_inbox', '_drain_task', '_callbacks', 'subscribed_symbols', 'subscribed_streams', '_pending_subs', '_sub_task'
+    )
+    
+    # Map timeframes (shared by all instances)
+    TIMEFRAME_MAP = {
+        "1Min": TimeFrame.Minute,
+        "5Min": TimeFrame(5, TimeFrameUnit.Minute),
+        "15Min": TimeFrame(15, TimeFrameUnit.Minute),
+        "30Min": TimeFrame(30, TimeFrameUnit.Minute),
+        "1H": TimeFrame.Hour,
+        "4H": TimeFrame(4, TimeFrameUnit.Hour),
+        "1D": TimeFrame.Day
+    }
+    
     def __init__(self, api_key: str, api_secret: str, base_url: str):
         """Initialize the data manager"""
         self.api_key = api_key
@@ -48,176 +202,250 @@ class AlpacaDataManager:
         
         # Initialize historical client
         self.hist_client = StockHistoricalDataClient(self.api_key, self.api_secret)
+        self._bars_pending: Dict[tuple, asyncio.Task] = {}  # In-flight default-window fetches
         
         # Initialize WebSocket connection
         self.ws = None
-        self.ws_thread = None
+        self._ws_task = None
         self.ws_running = False
         
-        # Map timeframes
-        self.timeframe_map = {
-            "1Min": TimeFrame.Minute,
-            "5Min": TimeFrame(5, TimeFrame.Minute),
-            "15Min": TimeFrame(15, TimeFrame.Minute),
-            "30Min": TimeFrame(30, TimeFrame.Minute),
-            "1H": TimeFrame.Hour,
-            "4H": TimeFrame(4, TimeFrame.Hour),
-            "1D": TimeFrame.Day
-        }
+        # Messages sent on every (re)connect, serialized once
+        self._auth_payload = orjson.dumps({
+            "action": "auth",
+            "key": self.api_key,
+            "secret": self.api_secret
+        }).decode()
+        self._initial_sub_payload = orjson.dumps({
+            "action": "subscribe",
+            "bars": ["SPY"]  # Test stream
+        }).decode()
+        
+        # Verified TLS context, reused across reconnects for session resumption
+        self._ssl_ctx = ssl.create_default_context()
         
         # Initialize data storage
-        self._latest_bars: Dict[str, pd.DataFrame] = {}
+        self._ring: Dict[str, BarRingBuffer] = {}
+        self._inbox = collections.deque(maxlen=INBOX_SIZE)
+        self._drain_task = None
         self._callbacks: List[Callable] = []
         self.subscribed_symbols = set()
+        self.subscribed_streams: Dict[str, set] = {}  # Stream name -> symbols
+        self._pending_subs: Dict[str, set] = {}
+        self._sub_task = None
+
+    async def _on_open(self, ws):
+        """Authenticate and subscribe once the WebSocket connection is open"""
+        logger.info("WebSocket connection opened")
+        # A new connection starts with no subscriptions, so restore any made before a reconnect
+        sub_payload = self._initial_sub_payload
+        if self.subscribed_streams:
+            sub_payload = self._resubscribe_payload()
+        # The stream processes messages in order, so both can go out together
+        await self._send_corked(ws, self._auth_payload, sub_payload)
+        logger.info("Authentication and stream subscriptions sent")
+        
+        # Send subscriptions queued while disconnected
+        if self._pending_subs and (self._sub_task is None or self._sub_task.done()):
+            self._sub_task = asyncio.create_task(self._flush_subs())
+
+    def _resubscribe_payload(self) -> str:
+        """Subscribe message for the test stream plus every stream subscribed so far"""
+        streams = {"bars": {"SPY"}}
+        for stream, symbols in self.subscribed_streams.items():
+            streams.setdefault(stream, set()).update(symbols)
+        subscribe_msg = {"action": "subscribe"}
+        for stream, symbols in streams.items():
+            subscribe_msg[stream] = sorted(symbols)
+        return orjson.dumps(subscribe_msg).decode()
+
+    async def _send_corked(self, ws, *payloads: str):
+        """Send several messages, coalescing them into as few TCP segments as possible"""
+        sock = ws.transport.get_extra_info('socket') if ws.transport else None
+        cork = sock is not None and hasattr(socket, 'TCP_CORK')  # Linux only
+        if cork:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+        try:
+            for payload in payloads:
+                await ws.send(payload)
+        finally:
+            if cork:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 0)
 
-    def _run_websocket(self):
-        """Run WebSocket connection in a separate thread"""
-        def on_message(ws, message):
-            data = json.loads(message)
+    async def _on_message(self, message):
+        """Decode a WebSocket frame and dispatch its messages"""
+        try:
+            data = STREAM_DECODER.decode(message)
+        except msgspec.ValidationError:
+            # Frame contains a message type without a schema, decode item by item
+            data = self._decode_untyped(message)
+        if logger.isEnabledFor(logging.DEBUG):  # Avoid formatting every frame when not tracing
             logger.debug(f"Message received: {data}")
-            if isinstance(data, list):
-                for msg in data:
-                    self._handle_message(msg)
+        
+        # Drain the frame, collecting bars so they are processed in one pass
+        bars = []
+        for msg in data:
+            if type(msg) is Bar:
+                bars.append(msg)
             else:
-                self._handle_message(data)
-
-        def on_error(ws, error):
-            logger.error(f"WebSocket error: {error}")
-
-        def on_close(ws, close_status_code, close_msg):
-            logger.info(f"WebSocket connection closed: {close_status_code} - {close_msg}")
-            self.ws_running = False
-
-        def on_open(ws):
-            logger.info("WebSocket connection opened")
-            # Send authentication message
-            auth_data = {
-                "action": "auth",
-                "key": self.api_key,
-                "secret": self.api_secret
-            }
-            ws.send(json.dumps(auth_data))
-            logger.info("Authentication message sent")
-            
-            # Wait a bit before subscribing
-            import time
-            time.sleep(1)
-            
-            # Subscribe to test stream
-            subscribe_message = {
-                "action": "subscribe",
-                "trades": ["SPY"],
-                "quotes": ["SPY"],
-                "bars": ["SPY"]
-            }
-            ws.send(json.dumps(subscribe_message))
-            logger.info("Stream subscriptions sent")
-
-        # Create WebSocket connection with exponential backoff
+                self._handle_message(msg)
+        
+        if bars:
+            # Queue bars and let a single drain task handle everything that arrives in a burst
+            self._inbox.extend(bars)
+            if self._drain_task is None or self._drain_task.done():
+                self._drain_task = asyncio.create_task(self._drain_inbox())
+
+    async def _drain_inbox(self):
+        """Process queued bars until the inbox is empty"""
+        while self._inbox:
+            bars = list(self._inbox)
+            self._inbox.clear()
+            await self._handle_bars_batch(bars)
+
+    async def _ws_loop(self):
+        """Run the WebSocket connection on the event loop"""
+        # Reconnect with capped, jittered exponential backoff
         max_retries = 5
         base_delay = 5  # seconds
+        max_delay = 60  # seconds
+        stable_after = 60  # seconds a session must last to reset the backoff
+        attempt = 0
         
         while self.ws_running:
-            for attempt in range(max_retries):
-                try:
-                    # Add jitter to avoid thundering herd
-                    import random
-                    jitter = random.uniform(0, 1)
-                    delay = (base_delay * (2 ** attempt)) + jitter
-                    
-                    if attempt > 0:
-                        logger.info(f"Waiting {delay:.2f} seconds before retry {attempt + 1}/{max_retries}...")
-                        import time
-                        time.sleep(delay)
-                    
-                    # Create WebSocket connection
-                    websocket.enableTrace(True)
-                    self.ws = websocket.WebSocketApp(
-                        self.ws_endpoint,
-                        on_message=on_message,
-                        on_error=on_error,
-                        on_close=on_close,
-                        on_open=on_open
-                    )
-                    
-                    # Run the WebSocket connection
-                    self.ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
+            connected_at = None
+            try:
+                # Create WebSocket connection and read until it closes
+                async with websockets.connect(self.ws_endpoint, ssl=self._ssl_ctx) as ws:
+                    self.ws = ws
+                    connected_at = time.monotonic()
+                    await self._on_open(ws)
+                    async for message in ws:
+                        await self._on_message(message)
+                
+                if self.ws_running:
+                    logger.warning("WebSocket disconnected, attempting to reconnect...")
                     
-                    # If we get here and ws_running is still True, try to reconnect
-                    if self.ws_running:
-                        logger.warning(f"WebSocket disconnected, attempting to reconnect...")
-                    else:
-                        break
-                        
-                except Exception as e:
-                    if attempt < max_retries - 1 and self.ws_running:
-                        logger.warning(f"Connection attempt {attempt + 1} failed: {e}")
-                    else:
-                        logger.error(f"Failed to connect after {max_retries} attempts")
-                        self.ws_running = False
-                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Connection attempt {attempt + 1} failed: {e}")
+            finally:
+                self.ws = None
+            
+            if not self.ws_running:
+                break
+            
+            # A long-lived session starts a fresh backoff, quick failures escalate it
+            if connected_at is not None and time.monotonic() - connected_at >= stable_after:
+                attempt = 0
+                continue
+            
+            attempt += 1
+            if attempt >= max_retries:
+                logger.error(f"Failed to connect after {max_retries} attempts")
+                self.ws_running = False
+                break
+            
+            # Add jitter to avoid thundering herd
+            delay = min(max_delay, base_delay * (2 ** attempt)) + random.uniform(0, 1)
+            logger.info(f"Waiting {delay:.2f} seconds before retry {attempt + 1}/{max_retries}...")
+            await asyncio.sleep(delay)
 
     async def start_streaming(self):
         """Start streaming real-time market data"""
         try:
             logger.info("Starting market data streaming...")
             
-            if self.ws_thread and self.ws_thread.is_alive():
-                logger.warning("WebSocket thread is already running")
+            if self._ws_task and not self._ws_task.done():
+                logger.warning("WebSocket task is already running")
                 return
             
             self.ws_running = True
-            self.ws_thread = threading.Thread(target=self._run_websocket)
-            self.ws_thread.daemon = True  # Thread will be terminated when main program exits
-            self.ws_thread.start()
+            self._ws_task = asyncio.create_task(self._ws_loop())
             
         except Exception as e:
             logger.error(f"Error connecting to streaming API: {e}", exc_info=True)
             raise
 
+    def _decode_untyped(self, message) -> List[StreamMessage]:
+        """Decode a frame generically, keeping only messages with a known schema"""
+        data = orjson.loads(message)
+        if not isinstance(data, list):
+            data = [data]
+        
+        messages = []
+        for item in data:
+            try:
+                messages.append(msgspec.convert(item, StreamMessage))
+            except msgspec.ValidationError:
+                logger.warning(f"Unknown message type: {item}")
+        return messages
+
     def _handle_message(self, msg):
         """Handle incoming WebSocket message"""
         try:
-            msg_type = msg.get('T')
-            if msg_type == 'b':  # Bar data
-                # Create a task to handle the bar data
-                asyncio.create_task(self._handle_bar(msg))
-            elif msg_type == 't':  # Trade data
-                logger.debug(f"Trade received: {msg}")
-            elif msg_type == 'q':  # Quote data
-                logger.debug(f"Quote received: {msg}")
-            elif msg_type == 'success':  # Authentication success
-                logger.info("Authentication successful")
-            elif msg_type == 'error':  # Error message
+            msg_type = type(msg)
+            if msg_type is Trade:  # Trade data
+                logger.debug("Trade received: %s", msg)
+            elif msg_type is Quote:  # Quote data
+                logger.debug("Quote received: %s", msg)
+            elif msg_type is Success:  # Connection/authentication success
+                logger.info(f"Stream status: {msg.msg}")
+            elif msg_type is StreamError:  # Error message
                 logger.error(f"Stream error: {msg}")
+            elif msg_type is Subscription:  # Subscription acknowledgement
+                logger.info(f"Subscriptions active: {msg}")
             else:
                 logger.warning(f"Unknown message type: {msg}")
         except Exception as e:
             logger.error(f"Error handling message: {e}", exc_info=True)
 
-    async def _handle_bar(self, bar):
-        """Handle incoming bar data"""
+    def _build_bar_columns(self, bars: List[Bar]) -> Dict[str, tuple]:
+        """Group a frame of bars by symbol into typed columns, preserving arrival order"""
+        by_symbol: Dict[str, list] = {}
+        for bar in bars:
+            by_symbol.setdefault(bar.S, []).append(
+                (bar.t, bar.o, bar.h, bar.l, bar.c, bar.v)
+            )
+        
+        columns = {}
+        for symbol, rows in by_symbol.items():
+            timestamps, opens, highs, lows, closes, volumes = zip(*rows)
+            columns[symbol] = (
+                pd.to_datetime(timestamps, utc=True).as_unit('ns').asi8,
+                opens, highs, lows, closes, volumes
+            )
+        return columns
+
+    async def _handle_bars_batch(self, bars: List[Bar]):
+        """Handle a batch of incoming bars from a single WebSocket frame"""
         try:
-            symbol = bar['S']
-            # Convert bar data to DataFrame format
-            bar_df = pd.DataFrame([{
-                'timestamp': bar['t'],
-                'open': bar['o'],
-                'high': bar['h'],
-                'low': bar['l'],
-                'close': bar['c'],
-                'volume': bar['v']
-            }])
-            
-            # Update latest bars
-            self._latest_bars[symbol] = bar_df
+            # Keep the event loop free while converting large frames
+            if len(bars) > LARGE_FRAME_BARS:
+                by_symbol = await asyncio.to_thread(self._build_bar_columns, bars)
+            else:
+                by_symbol = self._build_bar_columns(bars)
             
-            # Call registered callbacks
-            for callback in self._callbacks:
-                try:
-                    await callback(symbol, bar_df)
-                except Exception as e:
-                    logger.error(f"Error in callback: {e}")
+            for symbol, columns in by_symbol.items():
+                # Store directly into the symbol's ring buffer
+                ring = self._ring.get(symbol)
+                if ring is None:
+                    ring = self._ring[symbol] = BarRingBuffer()
+                ring.extend(*columns)
+                
+                callbacks = tuple(self._callbacks)
+                if not callbacks:
+                    continue
+                
+                # Call registered callbacks concurrently, once per symbol
+                latest_bars = ring.to_frame()
+                results = await asyncio.gather(
+                    *(callback(symbol, latest_bars) for callback in callbacks),
+                    return_exceptions=True
+                )
+                for result in results:
+                    if isinstance(result, Exception):
+                        logger.error(f"Error in callback: {result}")
             
         except Exception as e:
             logger.error(f"Error handling bar data: {e}")
@@ -229,57 +457,104 @@ class AlpacaDataManager:
         if self.ws:
             try:
                 # Send unsubscribe message for all symbols
-                if self.subscribed_symbols:
-                    unsubscribe_msg = {
-                        "action": "unsubscribe",
-                        "trades": list(self.subscribed_symbols),
-                        "quotes": list(self.subscribed_symbols),
-                        "bars": list(self.subscribed_symbols)
-                    }
-                    self.ws.send(json.dumps(unsubscribe_msg))
+                if self.subscribed_streams:
+                    unsubscribe_msg = {"action": "unsubscribe"}
+                    for stream, symbols in self.subscribed_streams.items():
+                        unsubscribe_msg[stream] = list(symbols)
+                    await self.ws.send(orjson.dumps(unsubscribe_msg).decode())
                 
                 # Close WebSocket connection
-                self.ws.close()
+                self.ws_running = False
+                await self.ws.close()
                 self.ws = None
                 
-                # Clear subscribed symbols
+                # Clear subscribed symbols and drop any queued subscriptions
                 self.subscribed_symbols.clear()
+                self.subscribed_streams.clear()
+                self._pending_subs.clear()
+                if self._sub_task and not self._sub_task.done():
+                    self._sub_task.cancel()
                 
-                # Stop WebSocket thread
-                self.ws_running = False
-                if self.ws_thread and self.ws_thread.is_alive():
-                    self.ws_thread.join(timeout=5)
-                    
             except Exception as e:
                 logger.error(f"Error stopping WebSocket: {e}", exc_info=True)
         
+        # Stop WebSocket task
+        self.ws_running = False
+        if self._ws_task and not self._ws_task.done():
+            try:
+                await asyncio.wait_for(self._ws_task, timeout=5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+        
         logger.info("Market data streaming stopped")
 
     async def get_historical_bars(self, symbol: str, timeframe: str, start: datetime = None, end: datetime = None) -> pd.DataFrame:
         """Get historical bars for a symbol"""
+        frames = await self.get_historical_bars_batch([symbol], timeframe, start, end)
+        return frames.get(symbol, pd.DataFrame())
+
+    async def get_historical_bars_batch(self, symbols: List[str], timeframe: str, start: datetime = None,
+                                        end: datetime = None) -> Dict[str, pd.DataFrame]:
+        """Get historical bars for several symbols in one request, keyed by symbol.
+        
+        Requests for the default window share a fetch that is already in flight
+        for the same symbols and timeframe.
+        """
+        if start or end:
+            return await self._fetch_historical_bars(symbols, timeframe, start, end)
+        
+        key = (tuple(symbols), timeframe)
+        task = self._bars_pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_historical_bars(symbols, timeframe))
+            self._bars_pending[key] = task
+            task.add_done_callback(lambda _: self._bars_pending.pop(key, None))
+        return dict(await asyncio.shield(task))
+
+    async def _fetch_historical_bars(self, symbols: List[str], timeframe: str, start: datetime = None,
+                                     end: datetime = None) -> Dict[str, pd.DataFrame]:
         try:
+            now = datetime.now(timezone.utc)
             if not start:
-                start = datetime.now(pytz.UTC) - timedelta(days=7)
+                start = now - timedelta(days=7)
             if not end:
-                end = datetime.now(pytz.UTC)
+                end = now
 
             request = StockBarsRequest(
-                symbol_or_symbols=symbol,
-                timeframe=self.timeframe_map[timeframe],
+                symbol_or_symbols=symbols,
+                timeframe=self.TIMEFRAME_MAP[timeframe],
                 start=start,
                 end=end
             )
             
-            bars = self.hist_client.get_stock_bars(request)
-            return pd.DataFrame(bars[symbol])
+            # The Alpaca client is synchronous; fetch on a worker thread so the event loop keeps serving
+            bars = await asyncio.to_thread(self.hist_client.get_stock_bars, request)
+            
+            frames = {}
+            for symbol in symbols:
+                # Build the frame in one typed allocation instead of inferring from objects
+                records = [
+                    (bar.timestamp, bar.open, bar.high, bar.low, bar.close, bar.volume)
+                    for bar in bars.data.get(symbol, ())
+                ]
+                if records:
+                    df = pd.DataFrame.from_records(records, columns=BAR_COLUMNS).astype(BAR_DTYPES)
+                    frames[symbol] = df.set_index('timestamp')
+            return frames
             
         except Exception as e:
             logger.error(f"Error fetching historical bars: {e}")
-            return pd.DataFrame()
+            return {}
 
     def get_latest_bar(self, symbol: str) -> pd.DataFrame:
         """Get the latest bar for a symbol"""
-        return self._latest_bars.get(symbol, pd.DataFrame())
+        ring = self._ring.get(symbol)
+        return ring.to_frame(1) if ring else pd.DataFrame()
+
+    def get_latest_bars(self, symbol: str) -> pd.DataFrame:
+        """Get the cached streaming bars for a symbol"""
+        ring = self._ring.get(symbol)
+        return ring.to_frame() if ring else None
 
     def add_bar_callback(self, callback: Callable):
         """Add a callback to be notified of new bars"""
@@ -290,27 +565,58 @@ class AlpacaDataManager:
         if callback in self._callbacks:
             self._callbacks.remove(callback)
 
-    async def subscribe_to_symbol(self, symbol: str):
-        """Subscribe to market data for a symbol"""
+    async def subscribe_to_symbol(self, symbol: str, trades: bool = False, quotes: bool = False, daily: bool = False):
+        """Subscribe to bars for a symbol, plus any optional streams requested"""
         if not self.ws or not self.ws_running:
             logger.warning("WebSocket not connected, cannot subscribe")
             return
             
-        if symbol in self.subscribed_symbols:
+        streams = ["bars"]
+        if trades:
+            streams.append("trades")
+        if quotes:
+            streams.append("quotes")
+        if daily:
+            streams.append("dailyBars")
+        # Only streams the symbol isn't already subscribed to or queued for
+        missing = [
+            stream for stream in streams
+            if symbol not in self.subscribed_streams.get(stream, ()) and symbol not in self._pending_subs.get(stream, ())
+        ]
+        if not missing:
             logger.info(f"Already subscribed to {symbol}")
             return
             
-        # Add to subscribed symbols
+        # Add to subscribed symbols and queue for the next flush
         self.subscribed_symbols.add(symbol)
+        for stream in missing:
+            self._pending_subs.setdefault(stream, set()).add(symbol)
+        if self._sub_task is None or self._sub_task.done():
+            self._sub_task = asyncio.create_task(self._flush_subs())
+
+    async def _flush_subs(self):
+        """Send all pending subscriptions as a single message"""
+        await asyncio.sleep(SUBSCRIBE_FLUSH_DELAY)
+        
+        if not self._pending_subs or not self.ws:
+            return  # Kept queued until a connection is open
+        pending = self._pending_subs
+        self._pending_subs = {}
         
         # Send subscription message
-        subscribe_msg = {
-            "action": "subscribe",
-            "trades": [symbol],
-            "quotes": [symbol],
-            "bars": [symbol],
-            "dailyBars": [symbol],
-            "statuses": [symbol]
-        }
-        self.ws.send(json.dumps(subscribe_msg))
-        logger.info("Stream subscriptions sent")
+        subscribe_msg = {"action": "subscribe"}
+        for stream, symbols in pending.items():
+            subscribe_msg[stream] = list(symbols)
+        try:
+            await self.ws.send(orjson.dumps(subscribe_msg).decode())
+        except Exception as e:
+            logger.error(f"Error sending subscriptions: {e}")
+            # Queue them again so they go out once the connection is back
+            for stream, symbols in pending.items():
+                self._pending_subs.setdefault(stream, set()).update(symbols)
+            return
+        
+        # Only record streams once the request has actually gone out
+        for stream, symbols in pending.items():
+            self.subscribed_streams.setdefault(stream, set()).update(symbols)
+        logger.info(f"Stream subscriptions sent for {len(set().union(*pending.values()))} symbols")
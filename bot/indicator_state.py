@@ -0,0 +1,157 @@
+from dataclasses import dataclass
+from typing import Dict, Tuple
+import numpy as np
+import pandas as pd
+
+from ._kernels import NUMBA_AVAILABLE, ema_last_kernel, macd_kernel, psar_kernel
+from .market_phases import calculate_ema
+
+EMA_PERIODS = (5, 7, 9, 11, 13, 34, 89)
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+PSAR_STEP = 0.02
+PSAR_MAX = 0.2
+
+def _alpha(period: int) -> float:
+    return 2.0 / (period + 1)
+
+@dataclass
+class PsarState:
+    """Parabolic SAR recursion state after the latest bar"""
+    sar: float
+    ep: float  # Extreme point of the current trend
+    af: float  # Acceleration factor
+    rising: bool
+    highs: Tuple[float, float]  # Highs of the last two bars, most recent last
+    lows: Tuple[float, float]  # Lows of the last two bars, most recent last
+
+    @classmethod
+    def start(cls, high: np.ndarray, low: np.ndarray) -> 'PsarState':
+        """Initial state from the first bar, with the direction taken from the first move"""
+        up = high[1] - high[0] if len(high) > 1 else 0.0
+        down = low[0] - low[1] if len(low) > 1 else 0.0
+        falling = down > up and down > 0
+        return cls(
+            sar=float(high[0] if falling else low[0]),
+            ep=float(low[0] if falling else high[0]),
+            af=PSAR_STEP,
+            rising=not falling,
+            highs=(float(high[0]), float(high[0])),
+            lows=(float(low[0]), float(low[0]))
+        )
+
+    def step(self, high: float, low: float):
+        """Advance the SAR by one bar"""
+        sar = self.sar + self.af * (self.ep - self.sar)
+        if self.rising:
+            # SAR may not move into the prior two bars' range
+            sar = min(sar, self.lows[0], self.lows[1])
+            if low < sar:
+                self.rising = False
+                sar, self.ep, self.af = self.ep, low, PSAR_STEP
+            elif high > self.ep:
+                self.ep = high
+                self.af = min(self.af + PSAR_STEP, PSAR_MAX)
+        else:
+            sar = max(sar, self.highs[0], self.highs[1])
+            if high > sar:
+                self.rising = True
+                sar, self.ep, self.af = self.ep, high, PSAR_STEP
+            elif low < self.ep:
+                self.ep = low
+                self.af = min(self.af + PSAR_STEP, PSAR_MAX)
+        self.sar = sar
+        self.highs = (self.highs[1], high)
+        self.lows = (self.lows[1], low)
+
+@dataclass
+class IndicatorState:
+    """Latest EMA, MACD and PSAR values for a symbol, advanced one bar at a time.
+
+    EMAs follow pandas ewm(adjust=False) seeded with the first close, like the
+    phase detector, so advancing the state bar by bar gives the same values as
+    recomputing it over the longer series.
+    """
+    timestamp: pd.Timestamp
+    emas: Dict[int, float]
+    macd_fast: float
+    macd_slow: float
+    macd_signal: float
+    psar: PsarState
+
+    @property
+    def macd(self) -> float:
+        return self.macd_fast - self.macd_slow
+
+    @property
+    def macd_hist(self) -> float:
+        return self.macd - self.macd_signal
+
+    @classmethod
+    def from_bars(cls, bars: pd.DataFrame) -> 'IndicatorState':
+        """Compute the state over a full OHLC frame"""
+        ohlc = bars[['high', 'low', 'close']].to_numpy(dtype=np.float64).T
+        high, low, close = (np.ascontiguousarray(column) for column in ohlc)
+        psar = PsarState.start(high, low)
+
+        if NUMBA_AVAILABLE:
+            emas = ema_last_kernel(close, np.array([_alpha(period) for period in EMA_PERIODS]))
+            fast, slow, signal = macd_kernel(close, _alpha(MACD_FAST), _alpha(MACD_SLOW), _alpha(MACD_SIGNAL))
+            if len(close) > 1:
+                psar.sar, psar.ep, psar.af, psar.rising = psar_kernel(
+                    high, low, psar.sar, psar.ep, psar.af, psar.rising, PSAR_STEP, PSAR_MAX
+                )
+                psar.highs = (float(high[-2]), float(high[-1]))
+                psar.lows = (float(low[-2]), float(low[-1]))
+        else:
+            emas = [calculate_ema(close, period)[-1] for period in EMA_PERIODS]
+            fast_ema = calculate_ema(close, MACD_FAST)
+            slow_ema = calculate_ema(close, MACD_SLOW)
+            fast, slow = fast_ema[-1], slow_ema[-1]
+            signal = calculate_ema(fast_ema - slow_ema, MACD_SIGNAL)[-1]
+            for i in range(1, len(close)):
+                psar.step(high[i], low[i])
+
+        return cls(
+            timestamp=bars.index[-1],
+            emas={period: float(ema) for period, ema in zip(EMA_PERIODS, emas)},
+            macd_fast=float(fast),
+            macd_slow=float(slow),
+            macd_signal=float(signal),
+            psar=psar
+        )
+
+    def advance(self, timestamp: pd.Timestamp, high: float, low: float, close: float):
+        """Fold one new bar into the state"""
+        for period, ema in self.emas.items():
+            alpha = _alpha(period)
+            self.emas[period] = (1.0 - alpha) * ema + alpha * close
+
+        alpha = _alpha(MACD_FAST)
+        self.macd_fast = (1.0 - alpha) * self.macd_fast + alpha * close
+        alpha = _alpha(MACD_SLOW)
+        self.macd_slow = (1.0 - alpha) * self.macd_slow + alpha * close
+        alpha = _alpha(MACD_SIGNAL)
+        self.macd_signal = (1.0 - alpha) * self.macd_signal + alpha * self.macd
+
+        self.psar.step(high, low)
+        self.timestamp = timestamp
+
+    def update(self, bars: pd.DataFrame) -> bool:
+        """Advance over the bars after the stored timestamp.
+
+        Returns False, leaving the state untouched, when the stored bar is no
+        longer in the frame and the state has to be rebuilt with from_bars.
+        """
+        index = bars.index
+        pos = index.searchsorted(self.timestamp)
+        if pos >= len(index) or index[pos] != self.timestamp:
+            return False
+
+        high = bars['high'].to_numpy(dtype=np.float64)
+        low = bars['low'].to_numpy(dtype=np.float64)
+        close = bars['close'].to_numpy(dtype=np.float64)
+        for i in range(pos + 1, len(index)):
+            self.advance(index[i], high[i], low[i], close[i])
+        return True
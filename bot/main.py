@@ -1,10 +1,14 @@
 import os
 import logging
-import signal
 import asyncio
 from dotenv import load_dotenv
 from bot.telegram_bot import BlackprintBot
 
+try:
+    import uvloop
+except ImportError:  # Not available on Windows
+    uvloop = None
+
 # Configure logging
 logging.basicConfig(
     level=os.getenv('LOG_LEVEL', 'INFO'),
@@ -17,12 +21,6 @@ logger = logging.getLogger(__name__)
 bot = None
 main_task = None
 
-def signal_handler(sig, frame):
-    """Handle shutdown signals"""
-    logger.info(f"Received signal {sig}, initiating shutdown...")
-    if main_task:
-        main_task.cancel()
-
 async def cleanup():
     """Cleanup resources"""
     try:
@@ -77,12 +75,10 @@ async def main():
 
 if __name__ == '__main__':
     try:
-        # Setup signal handlers
-        signal.signal(signal.SIGINT, signal_handler)
-        signal.signal(signal.SIGTERM, signal_handler)
+        # SIGINT and SIGTERM are handled by the bot's run(), which stops it on the loop
         
-        # Create event loop
-        loop = asyncio.new_event_loop()
+        # Create event loop (libuv-backed when available)
+        loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         
         # Run main task
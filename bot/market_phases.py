@@ -1,8 +1,12 @@
 from typing import Dict, List, Tuple
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from dataclasses import dataclass
 from enum import Enum
+from scipy.signal import lfilter, lfiltic
+
+from ._kernels import NUMBA_AVAILABLE, ema_kernel, triple_ema_kernel
 
 class MarketPhase(Enum):
     UNORDERED = "unordered"
@@ -10,6 +14,12 @@ class MarketPhase(Enum):
     TRENDING = "trending"
     PULLBACK = "pullback"
 
+# Phases bound once for the per-bar classification path
+_UNORDERED = MarketPhase.UNORDERED
+_EMERGING = MarketPhase.EMERGING
+_TRENDING = MarketPhase.TRENDING
+_PULLBACK = MarketPhase.PULLBACK
+
 class MarketIndex(Enum):
     US30 = "^DJI"      # Dow Jones Industrial Average
     SPX = "^GSPC"      # S&P 500
@@ -29,20 +39,85 @@ class PhaseDetectionConfig:
     pullback_threshold: float = 0.382  # Fibonacci retracement level
     index: MarketIndex = MarketIndex.US30  # Default to US30 (Dow Jones)
 
+# Number of frames whose EMAs are kept by each detector
+EMA_CACHE_SIZE = 8
+# Number of per-symbol phase results kept by each detector
+PHASE_CACHE_SIZE = 64
+
+def calculate_ema(values: np.ndarray, span: int, seed: float = None) -> np.ndarray:
+    """EMA matching pandas ewm(span=span, adjust=False).mean().
+    
+    The recurrence starts from ``seed`` (the EMA before ``values[0]``), or from
+    the first value when no seed is given, which is how pandas initializes it.
+    """
+    if len(values) == 0:
+        return np.empty(0, dtype=np.float64)
+    if seed is None:
+        seed = values[0]
+    alpha = 2.0 / (span + 1)
+    if NUMBA_AVAILABLE:
+        return ema_kernel(values, alpha, float(seed))
+    b, a = [alpha], [1.0, alpha - 1.0]
+    zi = lfiltic(b, a, y=[seed])
+    return lfilter(b, a, values, zi=zi)[0]
+
+def calculate_triple_ema(values: np.ndarray, spans: tuple, seeds: tuple = None, out: np.ndarray = None) -> tuple:
+    """Three EMAs over the same values, computed in a single pass when numba is available.
+    
+    Equivalent to calling calculate_ema once per span with the matching seed.
+    When ``out`` is given, shape (len(spans), len(values)), the EMAs are written
+    into its rows instead of new arrays.
+    """
+    if seeds is None:
+        seeds = (None,) * len(spans)
+    if out is None:
+        out = np.empty((len(spans), len(values)), dtype=np.float64)
+    if len(values) == 0:
+        return tuple(out)
+    if not NUMBA_AVAILABLE or len(spans) != 3:
+        for row, span, seed in zip(out, spans, seeds):
+            row[:] = calculate_ema(values, span, seed=seed)
+        return tuple(out)
+    alphas = np.array([2.0 / (span + 1) for span in spans])
+    seeds = np.array([values[0] if seed is None else seed for seed in seeds], dtype=np.float64)
+    return tuple(triple_ema_kernel(values, alphas, seeds, out))
+
+_SLOPE_OFFSETS = {}
+
+def _slope_offsets(n: int) -> np.ndarray:
+    """Centered x positions for an n-point regression, cached per window length"""
+    offsets = _SLOPE_OFFSETS.get(n)
+    if offsets is None:
+        offsets = _SLOPE_OFFSETS[n] = np.arange(n) - (n - 1) / 2.0
+    return offsets
+
 class MarketPhaseDetector:
     def __init__(self, config: PhaseDetectionConfig = None):
         self.config = config or PhaseDetectionConfig()
         self.index_data = None
         self.last_index_update = None
+        self._ema_cache = {}  # (frame identity, length, last index, last close, spans) -> EMA arrays
+        self._ema_state = {}  # symbol -> (index, close, spans, EMAs) of its last computation, for incremental updates
+        self._phase_cache = {}  # (symbol, length, first index, last index) -> (closes, phase, metrics)
+        self._spans = (self.config.fast_ema, self.config.medium_ema, self.config.slow_ema)
+        self._ema_cols = tuple(f'ema_{span}' for span in self._spans)
+        self._index_name = self.config.index.name
+        self._index_symbol = self.config.index.value
         
     def set_index(self, index: MarketIndex):
         """Update the reference index"""
         self.config.index = index
+        self._index_name = index.name
+        self._index_symbol = index.value
         self.index_data = None  # Reset cached data
         
     def get_index_symbol(self) -> str:
         """Get the current index symbol"""
-        return self.config.index.value
+        return self._index_symbol
+    
+    def get_index_name(self) -> str:
+        """Get the current index name"""
+        return self._index_name
         
     def update_index_data(self, data: pd.DataFrame):
         """Update the cached index data"""
@@ -50,71 +125,145 @@ class MarketPhaseDetector:
         self.last_index_update = pd.Timestamp.now()
         
     def calculate_emas(self, data: pd.DataFrame) -> pd.DataFrame:
-        """Calculate EMAs for phase detection"""
-        df = data.copy()
-        df[f'ema_{self.config.fast_ema}'] = df['close'].ewm(span=self.config.fast_ema, adjust=False).mean()
-        df[f'ema_{self.config.medium_ema}'] = df['close'].ewm(span=self.config.medium_ema, adjust=False).mean()
-        df[f'ema_{self.config.slow_ema}'] = df['close'].ewm(span=self.config.slow_ema, adjust=False).mean()
+        """Calculate EMAs for phase detection, added to the frame as ema_<span> columns"""
+        emas = self.calculate_ema_arrays(data)
+        df = data.copy(deep=False)
+        for col, ema in zip(self._ema_cols, emas.values()):
+            df[col] = ema
         return df
     
-    def detect_unordered_phase(self, df: pd.DataFrame) -> bool:
+    def calculate_ema_arrays(self, data: pd.DataFrame, symbol: str = None) -> Dict[str, np.ndarray]:
+        """Calculate the fast, medium and slow EMAs as read-only arrays.
+        
+        With a symbol, a frame that only appends bars to the symbol's previous
+        frame continues the previous EMAs instead of recomputing them.
+        """
+        close = data['close'].to_numpy(dtype=np.float64)
+        spans = self._spans
+        
+        # Reuse EMAs already computed for this frame
+        key = (id(data), len(data), data.index[-1] if len(data) else None, close[-1] if len(close) else None, spans)
+        emas = self._ema_cache.get(key)
+        if emas is None:
+            emas = self._update_emas(symbol, data.index, close, spans)
+            for ema in emas:
+                ema.flags.writeable = False  # Shared with every caller of this frame
+            if len(self._ema_cache) >= EMA_CACHE_SIZE:
+                self._ema_cache.pop(next(iter(self._ema_cache)))  # Evict the oldest entry
+            self._ema_cache[key] = emas
+        
+        return dict(zip(('fast', 'medium', 'slow'), emas))
+    
+    def _update_emas(self, symbol: str, index: pd.Index, close: np.ndarray, spans: tuple) -> tuple:
+        """Compute EMAs, only running the recurrence over bars added since the symbol's last call.
+        
+        The previous values are reused only when the new frame starts at the same
+        bar and holds the previous bars and closes unchanged, so the result is
+        always the same as computing the frame from scratch.
+        """
+        state = self._ema_state.get(symbol)
+        overlap = 0
+        if state is not None and state[2] == spans:
+            prev_index, prev_close, _, prev_emas = state
+            n = len(prev_close)
+            if (0 < n <= len(close) and index[0] == prev_index[0] and index[n - 1] == prev_index[-1] and
+                    np.array_equal(close[:n], prev_close)):
+                overlap = n
+        
+        if overlap:
+            # Copy the previous values and continue the recurrence in one block
+            block = np.empty((len(spans), len(close)), dtype=np.float64)
+            for row, prev_ema in zip(block, prev_emas):
+                row[:overlap] = prev_ema
+            calculate_triple_ema(close[overlap:], spans, seeds=tuple(prev_ema[-1] for prev_ema in prev_emas),
+                                 out=block[:, overlap:])
+            emas = tuple(block)
+        else:
+            emas = calculate_triple_ema(close, spans)
+        
+        self._ema_state[symbol] = (index, close, spans, emas)
+        return emas
+    
+    def _frame_emas(self, df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """EMA columns supplied by the caller, or None if missing or not filled up to the last bar"""
+        if not all(col in df.columns for col in self._ema_cols):
+            return None
+        emas = dict(zip(('fast', 'medium', 'slow'), (df[col].to_numpy() for col in self._ema_cols)))
+        if any(np.isnan(ema[-1]) for ema in emas.values()):
+            return None
+        return emas
+    
+    def calculate_phase_metrics(self, df: pd.DataFrame, emas: Dict[str, np.ndarray] = None,
+                                with_trend: bool = True, symbol: str = None) -> dict:
+        """Latest EMA values, slopes and momentum shared by all phase detectors.
+        
+        With ``with_trend=False`` only the latest EMA values and close are returned,
+        which is enough for the alignment checks.
+        """
+        if emas is None:
+            # Use EMA columns already on the frame, otherwise calculate them
+            emas = self._frame_emas(df)
+            if emas is None:
+                emas = self.calculate_ema_arrays(df, symbol=symbol)
+        fast, medium, slow = emas['fast'], emas['medium'], emas['slow']
+        close = np.asarray(df['close'])
+        
+        # Get latest values for metrics, indexing the arrays directly
+        metrics = {
+            'ema_fast': fast[-1],
+            'ema_medium': medium[-1],
+            'ema_slow': slow[-1],
+            'close': close[-1]
+        }
+        if not with_trend:
+            return metrics
+        
+        # Calculate slopes and momentum
+        metrics['fast_slope'], metrics['medium_slope'], metrics['slow_slope'] = self.calculate_slopes_batch(
+            fast, medium, slow
+        )
+        metrics['price_momentum'] = self.calculate_momentum(close)
+        return metrics
+    
+    def detect_unordered_phase(self, df: pd.DataFrame, metrics: dict = None) -> bool:
         """Detect unordered market phase - choppy price action with no clear trend"""
-        # Calculate EMAs if not already present
-        ema_cols = [f'ema_{self.config.fast_ema}', f'ema_{self.config.medium_ema}', f'ema_{self.config.slow_ema}']
-        if not all(col in df.columns for col in ema_cols):
-            df = self.calculate_emas(df)
-            
-        fast = df[f'ema_{self.config.fast_ema}']
-        medium = df[f'ema_{self.config.medium_ema}']
-        slow = df[f'ema_{self.config.slow_ema}']
-        
-        # Calculate slopes over different windows
-        fast_slope = self.calculate_slope(df[f'ema_{self.config.fast_ema}'])
-        medium_slope = self.calculate_slope(df[f'ema_{self.config.medium_ema}'])
-        slow_slope = self.calculate_slope(df[f'ema_{self.config.slow_ema}'])
-        
-        # Calculate momentum
-        momentum = self.calculate_momentum(df)
-        
-        # Get latest values
-        fast_val = fast.iloc[-1]
-        medium_val = medium.iloc[-1]
-        slow_val = slow.iloc[-1]
-        price = df['close'].iloc[-1]
-
+        if metrics is None:
+            metrics = self.calculate_phase_metrics(df)
+        
         # Check for clear lack of trend - all slopes near zero
-        slopes_weak = all(abs(slope) < 0.05 for slope in [fast_slope, medium_slope, slow_slope])
+        # Both unordered conditions require weak slopes, so stop early otherwise
+        slopes = [metrics['fast_slope'], metrics['medium_slope'], metrics['slow_slope']]
+        slopes_weak = all(abs(slope) < 0.05 for slope in slopes)
+        if not slopes_weak:
+            return False
         
         # Check for EMAs too close together
-        emas_compressed = abs(fast_val - slow_val) < 0.002 * price
+        price = metrics['close']
+        emas_compressed = abs(metrics['ema_fast'] - metrics['ema_slow']) < 0.002 * price
+        if emas_compressed:
+            return True
         
-        # Check for choppy price action
-        price_changes = df['close'].diff().rolling(5).std()
-        high_volatility = price_changes.iloc[-5:].mean() > 0.8  # Higher threshold
+        # Check for choppy price action - mean of the last five 5-bar rolling stds
+        # of price changes, which only needs the last 10 closes
+        price_changes = np.diff(np.asarray(df['close'], dtype=np.float64)[-10:])
+        if len(price_changes) < 5:
+            return False
+        volatility = sliding_window_view(price_changes, 5).std(axis=1, ddof=1)
+        volatility = volatility[~np.isnan(volatility)]  # Windows with gaps are skipped, as in pandas
+        high_volatility = volatility.size > 0 and volatility.mean() > 0.8  # Higher threshold
         
         # Detect unordered only when multiple conditions are met
-        return (slopes_weak and emas_compressed) or (slopes_weak and high_volatility)
+        return bool(high_volatility)
     
-    def detect_emerging_phase(self, df: pd.DataFrame) -> bool:
+    def detect_emerging_phase(self, df: pd.DataFrame, metrics: dict = None) -> bool:
         """Detect emerging phase - initial trend with accelerating momentum"""
-        # Calculate EMAs if not already present
-        ema_cols = [f'ema_{self.config.fast_ema}', f'ema_{self.config.medium_ema}', f'ema_{self.config.slow_ema}']
-        if not all(col in df.columns for col in ema_cols):
-            df = self.calculate_emas(df)
-
-        # Calculate slopes over different windows
-        fast_slope = self.calculate_slope(df[f'ema_{self.config.fast_ema}'])
-        medium_slope = self.calculate_slope(df[f'ema_{self.config.medium_ema}'])
-        slow_slope = self.calculate_slope(df[f'ema_{self.config.slow_ema}'])
-        
-        # Calculate momentum
-        momentum = self.calculate_momentum(df)
-        
-        # Get latest values
-        fast = df[f'ema_{self.config.fast_ema}'].iloc[-1]
-        medium = df[f'ema_{self.config.medium_ema}'].iloc[-1]
-        slow = df[f'ema_{self.config.slow_ema}'].iloc[-1]
-        price = df['close'].iloc[-1]
+        if metrics is None:
+            metrics = self.calculate_phase_metrics(df, with_trend=False)
+        
+        fast = metrics['ema_fast']
+        medium = metrics['ema_medium']
+        slow = metrics['ema_slow']
+        price = metrics['close']
 
         # Check for accelerating momentum - price above EMAs with margin
         margin = 0.001 * price  # 0.1% margin
@@ -123,41 +272,34 @@ class MarketPhaseDetector:
             fast > medium - margin and
             medium > slow - margin
         )
+        if not accelerating:
+            return False
+        if 'fast_slope' not in metrics:
+            metrics = self.calculate_phase_metrics(df)
         
         # All slopes should be positive but not too strong yet
         slopes_emerging = (
-            0.25 < fast_slope <= 0.75 and
-            0.15 < medium_slope <= 0.5 and
-            0 < slow_slope < 0.4  # Increased upper bound
+            0.25 < metrics['fast_slope'] <= 0.75 and
+            0.15 < metrics['medium_slope'] <= 0.5 and
+            0 < metrics['slow_slope'] < 0.4  # Increased upper bound
         )
         
         # Momentum should be positive but not too strong
-        momentum_emerging = 0.2 <= momentum <= 0.8  # Expanded upper bound
+        momentum_emerging = 0.2 <= metrics['price_momentum'] <= 0.8  # Expanded upper bound
         
-        return accelerating and slopes_emerging and momentum_emerging
+        return slopes_emerging and momentum_emerging
 
-    def detect_trending_phase(self, df: pd.DataFrame) -> bool:
+    def detect_trending_phase(self, df: pd.DataFrame, metrics: dict = None) -> bool:
         """
         Detect trending market phase - Emerging phase with additional confirmation
         """
-        # Calculate EMAs if not already present
-        ema_cols = [f'ema_{self.config.fast_ema}', f'ema_{self.config.medium_ema}', f'ema_{self.config.slow_ema}']
-        if not all(col in df.columns for col in ema_cols):
-            df = self.calculate_emas(df)
-
-        # Calculate slopes
-        fast_slope = self.calculate_slope(df[f'ema_{self.config.fast_ema}'])
-        medium_slope = self.calculate_slope(df[f'ema_{self.config.medium_ema}'])
-        slow_slope = self.calculate_slope(df[f'ema_{self.config.slow_ema}'])
-        
-        # Calculate momentum
-        momentum = self.calculate_momentum(df)
-        
-        # Get latest values
-        fast = df[f'ema_{self.config.fast_ema}'].iloc[-1]
-        medium = df[f'ema_{self.config.medium_ema}'].iloc[-1]
-        slow = df[f'ema_{self.config.slow_ema}'].iloc[-1]
-        price = df['close'].iloc[-1]
+        if metrics is None:
+            metrics = self.calculate_phase_metrics(df, with_trend=False)
+        
+        fast = metrics['ema_fast']
+        medium = metrics['ema_medium']
+        slow = metrics['ema_slow']
+        price = metrics['close']
 
         # Check for strong trend - EMAs well aligned with margin
         margin = 0.001 * price  # 0.1% margin
@@ -167,39 +309,33 @@ class MarketPhaseDetector:
             medium > slow - margin and
             fast - slow > 0.01 * price  # EMAs must be well separated
         )
+        # Slopes and momentum only matter once the EMAs are aligned
+        if not aligned:
+            return False
+        if 'fast_slope' not in metrics:
+            metrics = self.calculate_phase_metrics(df)
         
         # All slopes should be strongly positive
         steady_trend = (
-            fast_slope >= 0.35 and
-            medium_slope >= 0.35 and
-            slow_slope >= 0.25
+            metrics['fast_slope'] >= 0.35 and
+            metrics['medium_slope'] >= 0.35 and
+            metrics['slow_slope'] >= 0.25
         )
         
         # Strong momentum
-        price_momentum = momentum >= 0.25
+        price_momentum = metrics['price_momentum'] >= 0.25
         
-        return aligned and steady_trend and price_momentum
+        return steady_trend and price_momentum
     
-    def detect_pullback(self, df: pd.DataFrame) -> bool:
+    def detect_pullback(self, df: pd.DataFrame, metrics: dict = None) -> bool:
         """Detect pullback phase - price between EMAs with positive momentum"""
-        # Calculate EMAs if not already present
-        ema_cols = [f'ema_{self.config.fast_ema}', f'ema_{self.config.medium_ema}', f'ema_{self.config.slow_ema}']
-        if not all(col in df.columns for col in ema_cols):
-            df = self.calculate_emas(df)
-
-        # Get latest values
-        fast = df[f'ema_{self.config.fast_ema}'].iloc[-1]
-        medium = df[f'ema_{self.config.medium_ema}'].iloc[-1]
-        slow = df[f'ema_{self.config.slow_ema}'].iloc[-1]
-        price = df['close'].iloc[-1]
-
-        # Calculate slopes
-        fast_slope = self.calculate_slope(df[f'ema_{self.config.fast_ema}'])
-        medium_slope = self.calculate_slope(df[f'ema_{self.config.medium_ema}'])
-        slow_slope = self.calculate_slope(df[f'ema_{self.config.slow_ema}'])
+        if metrics is None:
+            metrics = self.calculate_phase_metrics(df)
         
-        # Calculate momentum
-        momentum = self.calculate_momentum(df)
+        fast = metrics['ema_fast']
+        medium = metrics['ema_medium']
+        slow = metrics['ema_slow']
+        price = metrics['close']
 
         # Price should be between fast and medium EMAs with margin
         margin = 0.001 * price  # 0.1% margin
@@ -212,62 +348,83 @@ class MarketPhaseDetector:
         
         # Allow more negative slopes but still require slow EMA positive
         slopes_ok = (
-            fast_slope > -0.1 and
-            medium_slope > -0.1 and
-            slow_slope > 0
+            metrics['fast_slope'] > -0.1 and
+            metrics['medium_slope'] > -0.1 and
+            metrics['slow_slope'] > 0
         )
 
         # Momentum should be turning positive after pullback
-        momentum_recovering = momentum > 0
+        momentum_recovering = metrics['price_momentum'] > 0
         
         return price_in_zone and prior_trend and slopes_ok and momentum_recovering
     
-    def detect_phase(self, df: pd.DataFrame) -> tuple[MarketPhase, dict]:
+    def detect_phase(self, df: pd.DataFrame, symbol: str = None) -> tuple[MarketPhase, dict]:
+        """Detect the market phase at the last bar of the frame.
+        
+        With a symbol, the result is cached by the frame's bar range and reused
+        while the frame holds the same closes, so repeat requests for the same
+        symbol and bar skip the computation.
+        """
         # Validate input data
         if df.empty or 'close' not in df.columns:
-            return MarketPhase.UNORDERED, {'error': 'Invalid input data'}
-            
-        # Always recalculate EMAs with latest data
-        df = self.calculate_emas(df)
+            return _UNORDERED, {'error': 'Invalid input data'}
+        
+        key = None
+        if symbol is not None:
+            key = (symbol, len(df), df.index[0], df.index[-1])
+            close = df['close'].to_numpy(dtype=np.float64)
+            cached = self._phase_cache.get(key)
+            if cached is not None and np.array_equal(cached[0], close):
+                return cached[1], dict(cached[2])
             
-        # Get latest values for metrics
-        metrics = {
-            'ema_fast': df[f'ema_{self.config.fast_ema}'].iloc[-1],
-            'ema_medium': df[f'ema_{self.config.medium_ema}'].iloc[-1],
-            'ema_slow': df[f'ema_{self.config.slow_ema}'].iloc[-1],
-            'close': df['close'].iloc[-1]
-        }
+        # Compute values, slopes and momentum once for all detectors, reusing
+        # EMA columns the caller already maintains
+        metrics = self.calculate_phase_metrics(df, symbol=symbol)
+        phase, metrics = self._classify_phase(df, metrics)
         
-        # Calculate slopes and momentum
-        metrics['fast_slope'] = self.calculate_slope(df[f'ema_{self.config.fast_ema}'])
-        metrics['medium_slope'] = self.calculate_slope(df[f'ema_{self.config.medium_ema}'])
-        metrics['slow_slope'] = self.calculate_slope(df[f'ema_{self.config.slow_ema}'])
-        metrics['price_momentum'] = self.calculate_momentum(df)
-
+        if key is not None:
+            if key not in self._phase_cache and len(self._phase_cache) >= PHASE_CACHE_SIZE:
+                self._phase_cache.pop(next(iter(self._phase_cache)))  # Evict the oldest entry
+            # Copied so later changes to the frame or the metrics can't alter the cached entry
+            self._phase_cache[key] = (close.copy(), phase, dict(metrics))
+        return phase, metrics
+    
+    def detect_phase_from_emas(self, close: np.ndarray, fast: np.ndarray, medium: np.ndarray,
+                               slow: np.ndarray) -> tuple[MarketPhase, dict]:
+        """Detect the phase from close prices and EMAs the caller already maintains"""
+        if len(close) == 0:
+            return _UNORDERED, {'error': 'Invalid input data'}
+        
+        data = {'close': np.asarray(close, dtype=np.float64)}
+        emas = {'fast': np.asarray(fast), 'medium': np.asarray(medium), 'slow': np.asarray(slow)}
+        metrics = self.calculate_phase_metrics(data, emas)
+        return self._classify_phase(data, metrics)
+    
+    def _classify_phase(self, df: pd.DataFrame, metrics: dict) -> tuple[MarketPhase, dict]:
         # Check phases in order of priority
         # 1. Check for trending phase first - most definitive
-        if self.detect_trending_phase(df):
+        if self.detect_trending_phase(df, metrics):
             metrics['detected_phase'] = 'trending'
-            return MarketPhase.TRENDING, metrics
+            return _TRENDING, metrics
             
         # 2. Check for pullback - requires prior trend
-        if self.detect_pullback(df):
+        if self.detect_pullback(df, metrics):
             metrics['detected_phase'] = 'pullback'
-            return MarketPhase.PULLBACK, metrics
+            return _PULLBACK, metrics
             
         # 3. Check for emerging phase - early trend
-        if self.detect_emerging_phase(df):
+        if self.detect_emerging_phase(df, metrics):
             metrics['detected_phase'] = 'emerging'
-            return MarketPhase.EMERGING, metrics
+            return _EMERGING, metrics
             
         # 4. Check for unordered phase - least definitive
-        if self.detect_unordered_phase(df):
+        if self.detect_unordered_phase(df, metrics):
             metrics['detected_phase'] = 'unordered'
-            return MarketPhase.UNORDERED, metrics
+            return _UNORDERED, metrics
             
         # Default to unordered if no other phase detected
         metrics['detected_phase'] = 'unordered'
-        return MarketPhase.UNORDERED, metrics
+        return _UNORDERED, metrics
 
     def _check_ema_alignment(self, metrics: dict) -> bool:
         # Require EMA hierarchy: fast > medium > slow
@@ -287,23 +444,44 @@ class MarketPhaseDetector:
             if len(valid_series) < 2:
                 return 0.0
             
-            x = np.arange(len(valid_series))
             y = valid_series.values.astype(float)
             
             # Handle constant values
             if np.all(y == y[0]):
                 return 0.0
             
-            # Calculate linear regression
-            A = np.vstack([x, np.ones(len(x))]).T
-            slope = np.linalg.lstsq(A, y, rcond=None)[0][0]
-            return float(slope)
+            # Closed-form least-squares slope: sum(xc * y) / sum(xc ** 2), xc = x - mean(x)
+            xc = _slope_offsets(len(y))
+            return float(np.dot(xc, y) / np.dot(xc, xc))
         except:
             return 0.0
 
-    def calculate_momentum(self, df: pd.DataFrame) -> float:
-        try:
-            momentum = df['close'].diff().dropna().rolling(5, min_periods=1).mean().iloc[-1]
-            return float(momentum) if not np.isnan(momentum) else 0.0
-        except:
-            return 0.0
+    def calculate_slopes_batch(self, fast, medium, slow, window: int = 5) -> Tuple[float, float, float]:
+        """Slopes of the three EMA series computed in one matrix-vector product"""
+        if min(len(fast), len(medium), len(slow)) >= window:
+            tails = np.stack([
+                np.asarray(fast, dtype=np.float64)[-window:],
+                np.asarray(medium, dtype=np.float64)[-window:],
+                np.asarray(slow, dtype=np.float64)[-window:]
+            ])
+            if not np.isnan(tails).any():
+                xc = _slope_offsets(window)
+                slopes = tails @ xc / np.dot(xc, xc)
+                slopes[np.ptp(tails, axis=1) == 0] = 0.0  # Constant series have no slope
+                return float(slopes[0]), float(slopes[1]), float(slopes[2])
+        
+        # Short or gappy series take the per-series path, which drops NaNs
+        return (
+            self.calculate_slope(pd.Series(fast), window),
+            self.calculate_slope(pd.Series(medium), window),
+            self.calculate_slope(pd.Series(slow), window)
+        )
+
+    def calculate_momentum(self, close: np.ndarray) -> float:
+        """Mean of the last five close-to-close price changes"""
+        changes = np.diff(np.asarray(close, dtype=np.float64)[-6:])
+        if np.isnan(changes).any():
+            # Gaps are skipped, so the window reaches further back
+            changes = np.diff(np.asarray(close, dtype=np.float64))
+            changes = changes[~np.isnan(changes)][-5:]
+        return float(changes.mean()) if changes.size else 0.0
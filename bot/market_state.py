@@ -1,17 +1,55 @@
 from typing import Dict, List, Optional, Tuple, Callable
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import math
+import orjson
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from enum import Enum
 
 from .market_phases import MarketPhase, MarketPhaseDetector, PhaseDetectionConfig
 from .data_manager import AlpacaDataManager
+from .indicator_state import IndicatorState
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Number of historical states kept for repeat queries
+HISTORICAL_CACHE_SIZE = 1024
+
+# Bars fetched before a historical timestamp, comfortably more than the slowest EMA (89)
+HISTORICAL_BARS = 120
+TRADING_MINUTES_PER_DAY = 390  # Regular session, 9:30-16:00 ET
+CANDLE_MINUTES = {
+    "1Min": 1,
+    "5Min": 5,
+    "15Min": 15,
+    "30Min": 30,
+    "1H": 60,
+    "4H": 240,
+    "1D": TRADING_MINUTES_PER_DAY
+}
+
+def history_window(candle_size: str, bars: int = HISTORICAL_BARS) -> pd.Timedelta:
+    """Calendar span that holds ``bars`` regular-session bars of the given size"""
+    minutes = CANDLE_MINUTES.get(candle_size)
+    if minutes is None:
+        return pd.Timedelta(days=30)
+    trading_days = math.ceil(bars * minutes / TRADING_MINUTES_PER_DAY)
+    # Weekends take 2 of every 7 days; pad a few more for holidays
+    return pd.Timedelta(days=math.ceil(trading_days * 7 / 5) + 4)
+
+def candle_duration(candle_size: str) -> pd.Timedelta:
+    """Wall-clock span of one candle of the given size"""
+    if candle_size == "1D":
+        return pd.Timedelta(days=1)
+    return pd.Timedelta(minutes=CANDLE_MINUTES.get(candle_size, 1))
+
+@dataclass(frozen=True, slots=True)
 class MarketMetrics:
     """Container for market metrics and indicators"""
     timestamp: datetime
@@ -30,6 +68,24 @@ class MarketMetrics:
     candle_size: str
     symbol: str
 
+    @classmethod
+    def from_indicators(
+        cls,
+        symbol: str,
+        timestamp: datetime,
+        phase: MarketPhase,
+        indicators: IndicatorState,
+        candle_size: str
+    ) -> 'MarketMetrics':
+        """Create market metrics from the detected phase and indicator state"""
+        return cls(
+            timestamp=timestamp,
+            phase=phase,
+            candle_size=candle_size,
+            symbol=symbol,
+            **_indicator_values(indicators)
+        )
+
     def to_dict(self) -> dict:
         """Convert metrics to dictionary for easy serialization"""
         return {
@@ -50,6 +106,147 @@ class MarketMetrics:
             'symbol': self.symbol
         }
 
+    def to_json(self) -> bytes:
+        """Serialize metrics to JSON in one orjson call.
+        
+        Unlike to_dict, values keep full precision and the phase is written as
+        its enum value.
+        """
+        return orjson.dumps(self, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def _indicator_values(indicators: IndicatorState) -> Dict[str, float]:
+    """Indicator values keyed by MarketMetrics field"""
+    emas = indicators.emas
+    return {
+        'ema_5': emas[5],
+        'ema_7': emas[7],
+        'ema_9': emas[9],
+        'ema_11': emas[11],
+        'ema_13': emas[13],
+        'ema_34': emas[34],
+        'ema_89': emas[89],
+        'psar': indicators.psar.sar,
+        'macd': indicators.macd,
+        'macd_signal': indicators.macd_signal,
+        'macd_hist': indicators.macd_hist
+    }
+
+def _json_default(obj):
+    # pandas Timestamps are datetime subclasses, which orjson leaves to the caller
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError
+
+# Numeric MarketMetrics fields, in declaration order
+METRIC_FIELDS = (
+    'ema_5', 'ema_7', 'ema_9', 'ema_11', 'ema_13', 'ema_34', 'ema_89',
+    'psar', 'macd', 'macd_signal', 'macd_hist'
+)
+PHASES = tuple(MarketPhase)
+PHASE_CODES = {phase: code for code, phase in enumerate(PHASES)}
+
+# Formatted reports kept for repeat notifications of the same state
+FORMAT_CACHE_SIZE = 512
+
+class MarketStateStore:
+    """Latest metrics per symbol, stored as one float64 column per field.
+    
+    Symbols get a fixed row on first update; columns double in size when full.
+    MarketMetrics objects are only built on request.
+    """
+    
+    def __init__(self, capacity: int = 8):
+        self._ids: Dict[str, int] = {}
+        self._timestamps: List[datetime] = []
+        self._columns: Dict[str, np.ndarray] = {field: np.empty(capacity) for field in METRIC_FIELDS}
+        self._phases = np.full(capacity, -1, dtype=np.int8)  # Index into PHASES, -1 when unset
+    
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._ids
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+    
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._ids)
+    
+    def column(self, field: str) -> np.ndarray:
+        """Values of a field for every stored symbol, in symbol order"""
+        if field == 'phase':
+            return self._phases[:len(self._ids)]
+        return self._columns[field][:len(self._ids)]
+    
+    def phase(self, symbol: str) -> Optional[MarketPhase]:
+        sid = self._ids.get(symbol)
+        return None if sid is None else PHASES[self._phases[sid]]
+    
+    def update(self, symbol: str, timestamp: datetime, phase: MarketPhase, values: Dict[str, float]) -> bool:
+        """Store the latest metrics for a symbol, returning True if its phase changed"""
+        sid = self._ids.get(symbol)
+        if sid is None:
+            sid = len(self._ids)
+            if sid == len(self._phases):
+                self._grow()
+            self._ids[symbol] = sid
+            self._timestamps.append(timestamp)
+        else:
+            self._timestamps[sid] = timestamp
+        
+        for field in METRIC_FIELDS:
+            self._columns[field][sid] = values[field]
+        code = PHASE_CODES[phase]
+        changed = self._phases[sid] != code
+        self._phases[sid] = code
+        return bool(changed)
+    
+    def materialize(self, symbol: str, candle_size: str) -> Optional[MarketMetrics]:
+        """Build the MarketMetrics for a symbol"""
+        sid = self._ids.get(symbol)
+        if sid is None:
+            return None
+        return MarketMetrics(
+            timestamp=self._timestamps[sid],
+            phase=PHASES[self._phases[sid]],
+            candle_size=candle_size,
+            symbol=symbol,
+            **{field: float(self._columns[field][sid]) for field in METRIC_FIELDS}
+        )
+    
+    def _grow(self):
+        capacity = 2 * len(self._phases)
+        for field, column in self._columns.items():
+            grown = np.empty(capacity)
+            grown[:len(column)] = column
+            self._columns[field] = grown
+        phases = np.full(capacity, -1, dtype=np.int8)
+        phases[:len(self._phases)] = self._phases
+        self._phases = phases
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _format_market_state(metrics: MarketMetrics, is_historical: bool) -> str:
+    """Format market state for display, memoized since metrics are immutable"""
+    timestamp_str = metrics.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+    historical_prefix = "[HISTORICAL] " if is_historical else ""
+    
+    return f"""{historical_prefix}Market State Report
+Symbol: {metrics.symbol}
+Timestamp: {timestamp_str}
+Candle Size: {metrics.candle_size}
+Market Phase: {metrics.phase.name}
+
+Key Indicators:
+- EMAs:
+  • Fast (5,7,9): {metrics.ema_5:.2f}, {metrics.ema_7:.2f}, {metrics.ema_9:.2f}
+  • Medium (11,13): {metrics.ema_11:.2f}, {metrics.ema_13:.2f}
+  • Slow (34,89): {metrics.ema_34:.2f}, {metrics.ema_89:.2f}
+- PSAR: {metrics.psar:.2f}
+- MACD:
+  • Line: {metrics.macd:.2f}
+  • Signal: {metrics.macd_signal:.2f}
+  • Histogram: {metrics.macd_hist:.2f}
+"""
+
 class MarketStateManager:
     """Manages market state tracking and phase detection"""
     
@@ -59,13 +256,22 @@ class MarketStateManager:
         self.detector = MarketPhaseDetector(config=self.config)
         
         # Cache for latest market states
-        self._latest_states: Dict[str, MarketMetrics] = {}
-        self._phase_change_callbacks: List[Callable] = []
+        self._latest_states = MarketStateStore()
+        self._indicator_states: Dict[str, IndicatorState] = {}
+        
+        # Phase and indicator math runs off the event loop. One worker keeps the
+        # detector's EMA caches and the indicator states single-threaded.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='market-state')
+        self._phase_change_callbacks: Tuple[Callable, ...] = ()
+        
+        # Historical states are fixed once computed; keep recent ones and share in-flight lookups
+        self._historical_cache: OrderedDict = OrderedDict()
+        self._historical_pending: Dict[tuple, asyncio.Task] = {}
         
         # Register for real-time updates
         self.data_manager.add_bar_callback(self._handle_market_update)
     
-    def _handle_market_update(self, symbol: str, new_data: pd.DataFrame):
+    async def _handle_market_update(self, symbol: str, new_data: pd.DataFrame):
         """Handle real-time market data updates"""
         try:
             # Get enough historical data for accurate calculations
@@ -74,49 +280,41 @@ class MarketStateManager:
                 logger.warning(f"Insufficient data for {symbol}, waiting for more bars")
                 return
             
-            # Detect phase and calculate metrics
-            phase, metrics = self.detector.detect_phase(latest_bars)
-            
-            # Create market metrics
-            current_metrics = MarketMetrics(
-                timestamp=latest_bars.index[-1],
-                phase=phase,
-                ema_5=metrics['ema_5'][-1],
-                ema_7=metrics['ema_7'][-1],
-                ema_9=metrics['ema_9'][-1],
-                ema_11=metrics['ema_11'][-1],
-                ema_13=metrics['ema_13'][-1],
-                ema_34=metrics['ema_34'][-1],
-                ema_89=metrics['ema_89'][-1],
-                psar=metrics['psar'][-1],
-                macd=metrics['macd'][-1],
-                macd_signal=metrics['macd_signal'][-1],
-                macd_hist=metrics['macd_hist'][-1],
-                candle_size=self.config.candle_size,
-                symbol=symbol
-            )
-            
-            # Check for phase change
-            old_metrics = self._latest_states.get(symbol)
-            phase_changed = (
-                old_metrics is None or 
-                old_metrics.phase != current_metrics.phase
+            # Detect phase and advance the indicators on the analysis thread
+            phase, values = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._analyze_latest_bars, symbol, latest_bars
             )
             
-            # Update latest state
-            self._latest_states[symbol] = current_metrics
+            # Update latest state, checking for a phase change
+            phase_changed = self._latest_states.update(symbol, latest_bars.index[-1], phase, values)
             
-            # Notify callbacks if phase changed
-            if phase_changed:
+            # Notify callbacks if phase changed, skipping the metrics build when nobody listens
+            if phase_changed and self._phase_change_callbacks:
+                current_metrics = self._latest_states.materialize(symbol, self.config.candle_size)
                 for callback in self._phase_change_callbacks:
-                    callback(symbol, current_metrics)
+                    await callback(symbol, current_metrics)
                     
         except Exception as e:
             logger.error(f"Error handling market update for {symbol}: {e}")
     
+    def _analyze_latest_bars(self, symbol: str, latest_bars: pd.DataFrame) -> Tuple[MarketPhase, Dict[str, float]]:
+        """Detect the phase and advance the indicators over the new bars"""
+        phase, _ = self.detector.detect_phase(latest_bars, symbol=symbol)
+        indicators = self._indicator_states.get(symbol)
+        if indicators is None or not indicators.update(latest_bars):
+            # Cold start, or the last processed bar has left the cache
+            indicators = IndicatorState.from_bars(latest_bars)
+            self._indicator_states[symbol] = indicators
+        return phase, _indicator_values(indicators)
+    
+    def _analyze_history(self, historical_data: pd.DataFrame) -> Tuple[MarketPhase, IndicatorState]:
+        """Detect the phase and calculate indicators over a historical frame"""
+        phase, _ = self.detector.detect_phase(historical_data)
+        return phase, IndicatorState.from_bars(historical_data)
+    
     def get_current_state(self, symbol: str) -> Optional[MarketMetrics]:
         """Get the current market state for a symbol"""
-        return self._latest_states.get(symbol)
+        return self._latest_states.materialize(symbol, self.config.candle_size)
     
     async def get_historical_state(
         self, 
@@ -124,13 +322,61 @@ class MarketStateManager:
         timestamp: datetime
     ) -> Optional[MarketMetrics]:
         """Get the market state at a specific historical timestamp"""
+        key = (
+            symbol,
+            timestamp.replace(second=0, microsecond=0).isoformat(),
+            self.config.candle_size,
+            self.config.index
+        )
+        state = self._historical_cache.get(key)
+        if state is not None:
+            self._historical_cache.move_to_end(key)
+        else:
+            # Concurrent queries for the same state wait on a single fetch
+            task = self._historical_pending.get(key)
+            if task is None:
+                task = asyncio.create_task(
+                    self._load_historical_state(key, symbol, timestamp, cache=not self._is_recent(timestamp))
+                )
+                self._historical_pending[key] = task
+            state = await asyncio.shield(task)
+        
+        # The state may have been computed for another timestamp within the same minute
+        if state is not None and state.timestamp != timestamp:
+            state = replace(state, timestamp=timestamp)
+        return state
+    
+    def _is_recent(self, timestamp: datetime) -> bool:
+        """Whether the timestamp falls in the latest closed candle or later, whose state new bars can still change"""
+        timestamp = pd.Timestamp(timestamp)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.tz_localize('UTC')  # Naive times are treated as UTC, as for bar requests
+        return timestamp >= pd.Timestamp.now(tz='UTC') - 2 * candle_duration(self.config.candle_size)
+    
+    async def _load_historical_state(self, key: tuple, symbol: str, timestamp: datetime,
+                                     cache: bool = True) -> Optional[MarketMetrics]:
+        """Compute a historical state, caching it on success unless asked not to"""
+        try:
+            state = await self._compute_historical_state(symbol, timestamp)
+        finally:
+            self._historical_pending.pop(key, None)
+        
+        if state is not None and cache:
+            self._historical_cache[key] = state
+            if len(self._historical_cache) > HISTORICAL_CACHE_SIZE:
+                self._historical_cache.popitem(last=False)  # Evict the least recently used state
+        return state
+    
+    async def _compute_historical_state(self, symbol: str, timestamp: datetime) -> Optional[MarketMetrics]:
+        """Fetch history up to the timestamp and detect the market state there"""
         try:
             # Get enough historical data before the timestamp
-            start_time = timestamp - pd.Timedelta(days=30)  # Get 30 days before
+            start_time = timestamp - history_window(self.config.candle_size)
             end_time = timestamp + pd.Timedelta(minutes=1)  # Include the target timestamp
             
-            historical_data = self.data_manager.get_historical_bars(
+            historical_data = await self.data_manager.get_historical_bars(
                 symbol=symbol,
+                timeframe=self.config.candle_size,
                 start=start_time,
                 end=end_time
             )
@@ -139,27 +385,13 @@ class MarketStateManager:
                 logger.warning(f"No historical data found for {symbol} at {timestamp}")
                 return None
             
-            # Detect phase and calculate metrics
-            phase, metrics = self.detector.detect_phase(historical_data)
+            # Detect phase and calculate indicators on the analysis thread
+            phase, indicators = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._analyze_history, historical_data
+            )
             
             # Create market metrics for the specific timestamp
-            return MarketMetrics(
-                timestamp=timestamp,
-                phase=phase,
-                ema_5=metrics['ema_5'][-1],
-                ema_7=metrics['ema_7'][-1],
-                ema_9=metrics['ema_9'][-1],
-                ema_11=metrics['ema_11'][-1],
-                ema_13=metrics['ema_13'][-1],
-                ema_34=metrics['ema_34'][-1],
-                ema_89=metrics['ema_89'][-1],
-                psar=metrics['psar'][-1],
-                macd=metrics['macd'][-1],
-                macd_signal=metrics['macd_signal'][-1],
-                macd_hist=metrics['macd_hist'][-1],
-                candle_size=self.config.candle_size,
-                symbol=symbol
-            )
+            return MarketMetrics.from_indicators(symbol, timestamp, phase, indicators, self.config.candle_size)
             
         except Exception as e:
             logger.error(f"Error getting historical state for {symbol} at {timestamp}: {e}")
@@ -167,27 +399,8 @@ class MarketStateManager:
     
     def register_phase_change_callback(self, callback: Callable):
         """Register a callback for market phase changes"""
-        self._phase_change_callbacks.append(callback)
+        self._phase_change_callbacks += (callback,)
     
     def format_market_state(self, metrics: MarketMetrics, is_historical: bool = False) -> str:
         """Format market state for display"""
-        timestamp_str = metrics.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-        historical_prefix = "[HISTORICAL] " if is_historical else ""
-        
-        return f"""{historical_prefix}Market State Report
-Symbol: {metrics.symbol}
-Timestamp: {timestamp_str}
-Candle Size: {metrics.candle_size}
-Market Phase: {metrics.phase.name}
-
-Key Indicators:
-- EMAs:
-  • Fast (5,7,9): {metrics.ema_5:.2f}, {metrics.ema_7:.2f}, {metrics.ema_9:.2f}
-  • Medium (11,13): {metrics.ema_11:.2f}, {metrics.ema_13:.2f}
-  • Slow (34,89): {metrics.ema_34:.2f}, {metrics.ema_89:.2f}
-- PSAR: {metrics.psar:.2f}
-- MACD:
-  • Line: {metrics.macd:.2f}
-  • Signal: {metrics.macd_signal:.2f}
-  • Histogram: {metrics.macd_hist:.2f}
-"""
+        return _format_market_state(metrics, is_historical)
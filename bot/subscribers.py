@@ -0,0 +1,133 @@
+from typing import Dict, Iterator, Set
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Seconds to collect subscription changes before writing them back in one transaction
+FLUSH_DELAY = 5.0
+
+class SubscriberStore:
+    """Subscribed chat ids, kept in memory and written back to SQLite in batches.
+
+    Nothing touches the disk until open() is called. The in-memory set answers
+    every read. Changes are queued and written by run() in a worker thread, at
+    most one transaction per FLUSH_DELAY, so neither the broadcast path nor the
+    event loop waits on the database.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()  # Serializes writes from run() and flush()
+        self._users: Set[int] = set()
+        self._pending: Dict[int, bool] = {}  # user_id -> subscribed, not yet written
+        self._changed = asyncio.Event()
+
+    def open(self):
+        """Open the database, creating it if needed, and load the stored subscribers"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Writes happen in worker threads, one at a time under the lock
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS subscribers (user_id INTEGER PRIMARY KEY)")
+        # Changes made before opening are kept on top of the stored set
+        stored = {row[0] for row in self._conn.execute("SELECT user_id FROM subscribers")}
+        self._users = {user_id for user_id in stored if self._pending.get(user_id, True)}
+        self._users.update(user_id for user_id, subscribed in self._pending.items() if subscribed)
+        if self._pending:
+            self._changed.set()
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._users
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._users)
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def add(self, user_id: int):
+        if user_id not in self._users:
+            self._users.add(user_id)
+            self._mark(user_id, True)
+
+    def discard(self, user_id: int):
+        if user_id in self._users:
+            self._users.discard(user_id)
+            self._mark(user_id, False)
+
+    def _mark(self, user_id: int, subscribed: bool):
+        self._pending[user_id] = subscribed
+        self._changed.set()
+
+    async def run(self):
+        """Write queued changes back until cancelled"""
+        while True:
+            await self._changed.wait()
+            # Let changes arriving in the meantime join the same transaction
+            await asyncio.sleep(FLUSH_DELAY)
+            pending = self._take_pending()
+            if not pending:
+                continue
+            try:
+                written = await asyncio.to_thread(self._write, pending)
+            except asyncio.CancelledError:
+                # Left for close() to write; writing a change twice is harmless
+                self._requeue(pending)
+                raise
+            if not written:
+                self._requeue(pending)
+
+    def flush(self):
+        """Write all queued changes in one transaction, blocking until it commits"""
+        pending = self._take_pending()
+        if pending and not self._write(pending):
+            self._requeue(pending)
+
+    def _take_pending(self) -> Dict[int, bool]:
+        self._changed.clear()
+        if self._conn is None:
+            return {}  # Kept queued until the database is opened
+        pending, self._pending = self._pending, {}
+        return pending
+
+    def _requeue(self, pending: Dict[int, bool]):
+        # Keep anything not superseded since, so the next flush retries it
+        pending.update(self._pending)
+        self._pending = pending
+        self._changed.set()
+
+    def _write(self, pending: Dict[int, bool]) -> bool:
+        with self._lock:
+            if self._conn is None:
+                return False  # Closed while this write was waiting
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO subscribers (user_id) VALUES (?)",
+                        [(user_id,) for user_id, subscribed in pending.items() if subscribed]
+                    )
+                    self._conn.executemany(
+                        "DELETE FROM subscribers WHERE user_id = ?",
+                        [(user_id,) for user_id, subscribed in pending.items() if not subscribed]
+                    )
+            except sqlite3.Error as e:
+                logger.error(f"Error saving subscribers: {e}")
+                return False
+        return True
+
+    def close(self):
+        """Write any queued changes and close the database"""
+        if self._conn is None:
+            return
+        self.flush()
+        with self._lock:
+            self._conn.close()
+            self._conn = None
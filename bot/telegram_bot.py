@@ -1,9 +1,11 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import logging
 import os
-from datetime import datetime
-import pytz
+from datetime import datetime, timedelta, timezone
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
+from telegram.error import BadRequest, Conflict, Forbidden, InvalidToken, RetryAfter, TelegramError
+from telegram.helpers import escape_markdown
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -13,11 +15,14 @@ from telegram.ext import (
     filters,
     CallbackContext
 )
+import orjson
 import pandas as pd
 from .market_phases import MarketIndex, PhaseDetectionConfig
-from .market_state import MarketStateManager
+from .market_state import MarketStateManager, history_window
 from .data_manager import AlpacaDataManager
+from .subscribers import SubscriberStore
 import asyncio
+import signal
 
 # Configure logging
 logging.basicConfig(
@@ -26,7 +31,96 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-VALID_TIMEFRAMES = ["1Min", "5Min", "15Min", "30Min", "1H", "4H", "1D"]
+# Values accepted by /setcandle (and its buttons) and /setindex
+CANDLE_TIMEFRAMES = ('1m', '5m', '15m', '1h', '1d')
+VALID_INDICES = ('SPY', 'QQQ', 'DIA')
+
+# Notification sends in flight at once, kept under Telegram's ~30 msg/s bot limit
+BROADCAST_CONCURRENCY = 25
+# Times a send is retried after Telegram asks us to slow down
+BROADCAST_RETRIES = 3
+# HTTP connections for regular API calls; must cover BROADCAST_CONCURRENCY plus command replies
+CONNECTION_POOL_SIZE = BROADCAST_CONCURRENCY + 7
+# Seconds Telegram holds each getUpdates request open waiting for updates
+POLL_TIMEOUT = 30
+# Errors that retrying won't fix, so the bot shuts down instead of hanging
+FATAL_ERRORS = (InvalidToken, Conflict)
+# Daily bars summarized by /historical
+HISTORICAL_DAYS = 30
+
+def _inline_keyboard(labels, prefix: str, per_row: int) -> InlineKeyboardMarkup:
+    """Create an inline keyboard with one button per label, per_row buttons to a row"""
+    buttons = tuple(InlineKeyboardButton(label, callback_data=f"{prefix}_{label}") for label in labels)
+    return InlineKeyboardMarkup([buttons[i:i + per_row] for i in range(0, len(buttons), per_row)])
+
+class OrjsonRequest(HTTPXRequest):
+    """HTTPX request that parses Telegram's responses with orjson"""
+    
+    @staticmethod
+    def parse_json_payload(payload: bytes) -> dict:
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            # Let PTB handle invalid UTF-8 and report bad payloads as usual
+            return HTTPXRequest.parse_json_payload(payload)
+
+# Keyboards built from constant option lists are shared by every bot instance
+MAIN_KEYBOARD = ReplyKeyboardMarkup([
+    [KeyboardButton("/analyze"), KeyboardButton("/historical")],
+    [KeyboardButton("/subscribe"), KeyboardButton("/unsubscribe")],
+    [KeyboardButton("/setcandle"), KeyboardButton("/setindex")],
+    [KeyboardButton("/help")]
+], resize_keyboard=True)
+TIMEFRAME_KEYBOARD = _inline_keyboard(CANDLE_TIMEFRAMES, "timeframe", 3)
+INDEX_KEYBOARD = _inline_keyboard([index.name for index in MarketIndex], "index", 2)
+
+WELCOME_MESSAGE = (
+    "👋 Welcome to Blackprint Trading Bot!\n\n"
+    "I can help you analyze stocks and manage your portfolio. Here are some things I can do:\n"
+    "- /analyze <symbol> - Get real-time market analysis\n"
+    "- /historical <symbol> - View historical data\n"
+    "- /subscribe <symbol> - Get notifications for a stock\n"
+    "- /unsubscribe <symbol> - Stop notifications\n"
+    "- /help - See all available commands\n\n"
+    "Try analyzing a stock like AAPL or GOOGL!"
+)
+HELP_MESSAGE = (
+    "🤖 Blackprint Trading Bot Commands:\n\n"
+    "Market Analysis:\n"
+    "- /analyze <symbol> - Get real-time market analysis\n"
+    "- /historical <symbol> - View historical data\n\n"
+    "Notifications:\n"
+    "- /subscribe <symbol> - Get notifications for a stock\n"
+    "- /unsubscribe <symbol> - Stop notifications\n\n"
+    "Settings:\n"
+    f"- /setcandle <{'|'.join(CANDLE_TIMEFRAMES)}> - Set candle timeframe\n"
+    f"- /setindex <{'|'.join(VALID_INDICES)}> - Set market index\n\n"
+    "Other:\n"
+    "- /help - Show this help message\n"
+    "- /start - Show welcome message\n\n"
+    "You can also type any stock symbol directly!"
+)
+
+# Reply templates for the analysis commands
+ANALYSIS_TEMPLATE = (
+    "📊 {symbol} Analysis:\n\n"
+    "Current Price: ${close:.2f}\n"
+    "Daily Change: {change:.2f}%\n"
+    "Volume: {volume:,}\n"
+    "High: ${high:.2f}\n"
+    "Low: ${low:.2f}\n\n"
+    "Want real-time updates? Use /subscribe {symbol}"
+)
+HISTORICAL_TEMPLATE = (
+    "📈 {symbol} Historical Analysis ({days} Days):\n\n"
+    "Start Price: ${start:.2f}\n"
+    "End Price: ${end:.2f}\n"
+    "Total Change: {change:.2f}%\n"
+    "Average Volume: {avg_volume:,.0f}\n"
+    "Highest Price: ${high:.2f}\n"
+    "Lowest Price: ${low:.2f}\n\n"
+    "Want real-time updates? Use /subscribe {symbol}"
+)
 
 class BlackprintBot:
     """Telegram bot for Blackprint trading strategy"""
@@ -38,11 +132,14 @@ class BlackprintBot:
         self.api_key = os.getenv('ALPACA_API_KEY')
         self.api_secret = os.getenv('ALPACA_API_SECRET')
         self.base_url = os.getenv('ALPACA_API_URL', 'https://paper-api.alpaca.markets')
+        self.subscribers_db = os.getenv('SUBSCRIBERS_DB', 'data/subscribers.db')
         
         # Initialize components
         self.application = None
         self.data_manager = None
         self.streaming_task = None
+        self.subscriber_task = None
+        self._stop_event = asyncio.Event()
         
         # Initialize message handlers
         self.message_handlers = {
@@ -60,30 +157,62 @@ class BlackprintBot:
         # Initialize managers
         self.market_manager = None
         
-        # Register for phase change notifications
-        self.subscribed_users = set()
+        # Register for phase change notifications; the database is opened in initialize()
+        self.subscribed_users = SubscriberStore(self.subscribers_db)
+        self._send_sem = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+        self._broadcast_tasks = set()  # Alerts being sent, referenced until they finish
         
         # Common symbols for quick access
         self.quick_symbols = ["AAPL", "MSFT", "GOOGL", "AMZN", "META"]
+        
+        # Inline button handlers, keyed by the callback data prefix and called with the button value
+        self.callback_handlers = {
+            "analyze": self._analyze_symbol,
+            "timeframe": self._set_timeframe,
+            "index": self._select_index
+        }
+    
+    @property
+    def quick_symbols(self) -> tuple:
+        return self._quick_symbols
+    
+    @quick_symbols.setter
+    def quick_symbols(self, symbols):
+        # Stored as a tuple so the cached keyboard can't go stale behind our back
+        self._quick_symbols = tuple(symbols)
+        self._symbol_keyboard = _inline_keyboard(self._quick_symbols, "analyze", 3)
     
     async def initialize(self):
         """Initialize the application"""
         logger.info("Initializing application...")
         
         # Create application instance
-        self.application = Application.builder().token(self.token).build()
+        self.application = (
+            Application.builder()
+            .token(self.token)
+            .request(OrjsonRequest(
+                connection_pool_size=CONNECTION_POOL_SIZE,
+                pool_timeout=30.0,
+                connect_timeout=10.0,
+                read_timeout=30.0
+            ))
+            # Leave room past the long-poll window so idle polls don't time out client-side
+            .get_updates_request(OrjsonRequest(
+                connection_pool_size=1,
+                read_timeout=POLL_TIMEOUT + 5,
+                connect_timeout=15
+            ))
+            # Handle updates in parallel so one slow command doesn't hold up other chats
+            .concurrent_updates(True)
+            .build()
+        )
         await self.application.initialize()
         
-        # Add handlers
-        self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
-        for command in self.message_handlers:
-            self.application.add_handler(CommandHandler(command.lstrip('/'), self.message_handlers[command]))
-        
-        # Add callback query handler
-        self.application.add_handler(CallbackQueryHandler(self.button_callback))
+        # Load subscribers saved by previous runs
+        self.subscribed_users.open()
         
-        # Add error handler
-        self.application.add_error_handler(self.error_handler)
+        # Add handlers
+        self.setup_handlers()
         
         # Initialize data manager
         self.data_manager = AlpacaDataManager(self.api_key, self.api_secret, self.base_url)
@@ -93,12 +222,16 @@ class BlackprintBot:
         
         # Register for phase change notifications
         self.market_manager.register_phase_change_callback(self._handle_phase_change)
-        
-        # Setup command handlers
-        self.setup_handlers()
     
     async def run(self):
-        """Run the bot"""
+        """Run the bot until stop() is called, SIGINT/SIGTERM arrives or a fatal error occurs"""
+        loop = asyncio.get_running_loop()
+        signals = (signal.SIGINT, signal.SIGTERM)
+        try:
+            for sig in signals:
+                loop.add_signal_handler(sig, self.stop)
+        except NotImplementedError:  # Not available on Windows, where only cancellation stops the bot
+            signals = ()
         try:
             if not self.token:
                 logger.error("No bot token provided")
@@ -114,7 +247,13 @@ class BlackprintBot:
             logger.info("Starting application...")
             await self.application.start()
             logger.info("Starting polling...")
-            await self.application.updater.start_polling(drop_pending_updates=True)
+            await self.application.updater.start_polling(
+                timeout=POLL_TIMEOUT,
+                allowed_updates=[Update.MESSAGE, Update.CALLBACK_QUERY],
+                drop_pending_updates=True,
+                bootstrap_retries=-1,
+                error_callback=self._polling_error
+            )
             logger.info("Polling started successfully")
             
             # Start market data streaming
@@ -122,130 +261,97 @@ class BlackprintBot:
             self.streaming_task = asyncio.create_task(self.data_manager.start_streaming())
             logger.info("Streaming task created")
             
-            # Main loop
+            # Write subscription changes back to disk in the background
+            self.subscriber_task = asyncio.create_task(self.subscribed_users.run())
+            
+            # Idle until stop() is called or the task is cancelled
             logger.info("Entering main loop...")
-            while True:
-                if not self.application.running:
-                    break
-                await asyncio.sleep(1)
+            await self._stop_event.wait()
                 
         except Exception as e:
             logger.error(f"Error in run loop: {e}", exc_info=True)
         finally:
+            for sig in signals:
+                loop.remove_signal_handler(sig)
             await self.cleanup()
 
+    def stop(self):
+        """Ask run() to return and clean up"""
+        self._stop_event.set()
+
+    def _polling_error(self, error: TelegramError):
+        """Log errors from polling for updates, stopping on ones that won't go away"""
+        logger.error("Error while polling for updates: %s", error, exc_info=error)
+        if isinstance(error, FATAL_ERRORS):
+            self.stop()
+
     async def cleanup(self):
         """Cleanup resources"""
         logger.info("Starting cleanup...")
-        
-        # Stop market data streaming
-        await self.data_manager.stop_streaming()
-        
-        # Stop the application
-        if self.application and self.application.running:
-            logger.info("Stopping application...")
-            await self.application.stop()
-            await self.application.shutdown()
-            logger.info("Application stopped")
-            
-        # Cancel any remaining tasks
-        for task in asyncio.all_tasks():
-            if task is not asyncio.current_task():
+        try:
+            # Stop market data streaming
+            if self.data_manager:
+                await self.data_manager.stop_streaming()
+            
+            # Drop alerts still being sent before the application goes away
+            for task in self._broadcast_tasks:
                 task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
+            
+            # Stop the application, polling first since it can't shut down while the updater runs
+            if self.application and self.application.running:
+                logger.info("Stopping application...")
+                if self.application.updater and self.application.updater.running:
+                    await self.application.updater.stop()
+                await self.application.stop()
+                await self.application.shutdown()
+                logger.info("Application stopped")
+                
+            # Cancel any remaining tasks
+            for task in asyncio.all_tasks():
+                if task is not asyncio.current_task():
+                    task.cancel()
+                    try:
+                        await task
+                    except asyncio.CancelledError:
+                        pass
+        finally:
+            # Save subscription changes the background writer hadn't reached yet, even if shutdown failed
+            self.subscribed_users.close()
                 
     def setup_handlers(self):
         """Setup command and message handlers"""
-        # Basic commands
-        self.application.add_handler(CommandHandler("start", self.start_command))
-        self.application.add_handler(CommandHandler("help", self.help_command))
-        
-        # Market analysis commands
-        self.application.add_handler(CommandHandler("analyze", self.analyze_stock))
-        self.application.add_handler(CommandHandler("historical", self.historical_command))
-        self.application.add_handler(CommandHandler("subscribe", self.subscribe_command))
-        self.application.add_handler(CommandHandler("unsubscribe", self.unsubscribe_command))
-        
-        # Settings commands
-        self.application.add_handler(CommandHandler("setcandle", self.set_candle_command))
-        self.application.add_handler(CommandHandler("setindex", self.set_index_command))
-        self.application.add_handler(CommandHandler("candle", self.handle_candle_length))
+        self.application.add_handlers([
+            MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message),
+            *(CommandHandler(command.lstrip('/'), handler) for command, handler in self.message_handlers.items()),
+            CallbackQueryHandler(self.button_callback)
+        ])
+        self.application.add_error_handler(self.error_handler)
     
     def get_main_keyboard(self) -> ReplyKeyboardMarkup:
-        """Create the main keyboard with common commands"""
-        keyboard = [
-            [KeyboardButton("/analyze"), KeyboardButton("/historical")],
-            [KeyboardButton("/subscribe"), KeyboardButton("/unsubscribe")],
-            [KeyboardButton("/setcandle"), KeyboardButton("/setindex")],
-            [KeyboardButton("/help")]
-        ]
-        return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        """Get the main keyboard with common commands"""
+        return MAIN_KEYBOARD
     
     def get_symbol_keyboard(self) -> InlineKeyboardMarkup:
-        """Create inline keyboard with common symbols"""
-        keyboard = []
-        # Create rows of 3 symbols each
-        for i in range(0, len(self.quick_symbols), 3):
-            row = []
-            for symbol in self.quick_symbols[i:i+3]:
-                row.append(InlineKeyboardButton(
-                    symbol, 
-                    callback_data=f"analyze_{symbol}"
-                ))
-            keyboard.append(row)
-        return InlineKeyboardMarkup(keyboard)
+        """Get the inline keyboard with common symbols"""
+        return self._symbol_keyboard
     
     def get_timeframe_keyboard(self) -> InlineKeyboardMarkup:
-        """Create inline keyboard with timeframe options"""
-        keyboard = []
-        # Create rows of 3 timeframes each
-        for i in range(0, len(VALID_TIMEFRAMES), 3):
-            row = []
-            for tf in VALID_TIMEFRAMES[i:i+3]:
-                row.append(InlineKeyboardButton(
-                    tf, 
-                    callback_data=f"timeframe_{tf}"
-                ))
-            keyboard.append(row)
-        return InlineKeyboardMarkup(keyboard)
+        """Get the inline keyboard with timeframe options"""
+        return TIMEFRAME_KEYBOARD
     
     def get_index_keyboard(self) -> InlineKeyboardMarkup:
-        """Create inline keyboard with index options"""
-        keyboard = []
-        indices = [index.name for index in MarketIndex]
-        # Create rows of 2 indices each
-        for i in range(0, len(indices), 2):
-            row = []
-            for idx in indices[i:i+2]:
-                row.append(InlineKeyboardButton(
-                    idx, 
-                    callback_data=f"index_{idx}"
-                ))
-            keyboard.append(row)
-        return InlineKeyboardMarkup(keyboard)
-
+        """Get the inline keyboard with index options"""
+        return INDEX_KEYBOARD
+    
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle button callbacks"""
         query = update.callback_query
         await query.answer()  # Acknowledge the button press
         
-        data = query.data
-        if data.startswith("analyze_"):
-            symbol = data.split("_")[1]
-            # Create new context args for the analyze command
-            context.args = [symbol]
-            await self.analyze_stock(update, context)
-            
-        elif data.startswith("timeframe_"):
-            timeframe = data.split("_")[1]
-            context.args = [timeframe]
-            await self.set_candle_command(update, context)
-            
-        elif data.startswith("index_"):
-            await self.handle_index_callback(update, context)
+        action, _, arg = query.data.partition("_")
+        handler = self.callback_handlers.get(action)
+        if handler:
+            await handler(update, context, arg)
     
     async def handle_message(self, update: Update, context: CallbackContext) -> None:
         """Handle non-command messages"""
@@ -254,7 +360,7 @@ class BlackprintBot:
             
             # Check if it's a stock symbol
             if message in self.quick_symbols:
-                await self.analyze_stock(update, context)
+                await self._analyze_symbol(update, context, message)
             else:
                 await update.message.reply_text(
                     "I don't understand that command. Try /help to see what I can do!"
@@ -266,17 +372,7 @@ class BlackprintBot:
     async def start_command(self, update: Update, context: CallbackContext) -> None:
         """Handle the /start command"""
         try:
-            welcome_message = (
-                "👋 Welcome to Blackprint Trading Bot!\n\n"
-                "I can help you analyze stocks and manage your portfolio. Here are some things I can do:\n"
-                "- /analyze <symbol> - Get real-time market analysis\n"
-                "- /historical <symbol> - View historical data\n"
-                "- /subscribe <symbol> - Get notifications for a stock\n"
-                "- /unsubscribe <symbol> - Stop notifications\n"
-                "- /help - See all available commands\n\n"
-                "Try analyzing a stock like AAPL or GOOGL!"
-            )
-            await update.message.reply_text(welcome_message, reply_markup=self.get_main_keyboard())
+            await update.message.reply_text(WELCOME_MESSAGE, reply_markup=self.get_main_keyboard())
         except Exception as e:
             logger.error(f"Error in start command: {e}", exc_info=True)
             await update.message.reply_text("Sorry, I couldn't process that command.")
@@ -284,23 +380,7 @@ class BlackprintBot:
     async def help_command(self, update: Update, context: CallbackContext) -> None:
         """Handle the /help command"""
         try:
-            help_message = (
-                "🤖 Blackprint Trading Bot Commands:\n\n"
-                "Market Analysis:\n"
-                "- /analyze <symbol> - Get real-time market analysis\n"
-                "- /historical <symbol> - View historical data\n\n"
-                "Notifications:\n"
-                "- /subscribe <symbol> - Get notifications for a stock\n"
-                "- /unsubscribe <symbol> - Stop notifications\n\n"
-                "Settings:\n"
-                "- /setcandle <1m|5m|15m|1h|1d> - Set candle timeframe\n"
-                "- /setindex <SPY|QQQ|DIA> - Set market index\n\n"
-                "Other:\n"
-                "- /help - Show this help message\n"
-                "- /start - Show welcome message\n\n"
-                "You can also type any stock symbol directly!"
-            )
-            await update.message.reply_text(help_message, reply_markup=self.get_main_keyboard())
+            await update.message.reply_text(HELP_MESSAGE, reply_markup=self.get_main_keyboard())
         except Exception as e:
             logger.error(f"Error in help command: {e}", exc_info=True)
             await update.message.reply_text("Sorry, I couldn't process that command.")
@@ -308,54 +388,85 @@ class BlackprintBot:
     async def analyze_stock(self, update: Update, context: CallbackContext) -> None:
         """Analyze a stock symbol"""
         try:
-            # Get the symbol from the message
+            # Get the symbols from the message, dropping repeats
             if context.args:
-                symbol = context.args[0].upper()
+                symbols = list(dict.fromkeys(arg.upper() for arg in context.args))
             else:
-                symbol = update.message.text.upper()
+                symbols = [update.message.text.upper()]
             
+            if len(symbols) == 1:
+                await self._analyze_symbol(update, context, symbols[0])
+            else:
+                await self._analyze_symbols(update, symbols)
+                
+        except Exception as e:
+            logger.error(f"Error in analyze command: {e}", exc_info=True)
+            await update.message.reply_text("Sorry, I couldn't process that command.")
+
+    async def _analyze_symbol(self, update: Update, context: CallbackContext, symbol: str) -> None:
+        """Reply with the analysis of a symbol, from a command or a button press"""
+        reply_to = update.effective_message
+        try:
             if symbol not in self.quick_symbols:
-                await update.message.reply_text(
+                await reply_to.reply_text(
                     f"Sorry, I can only analyze these symbols for now: {', '.join(self.quick_symbols)}"
                 )
                 return
             
             # Send initial message
-            message = await update.message.reply_text(f"Analyzing {symbol}...")
+            message = await reply_to.reply_text(f"Analyzing {symbol}...")
             
             # Get market data
             try:
-                bars = await self.data_manager.get_historical_bars(symbol, "1Day", limit=5)
-                if bars is None or bars.empty:
-                    await message.edit_text(f"No data available for {symbol}")
-                    return
-                
-                # Calculate basic metrics
-                last_bar = bars.iloc[-1]
-                prev_bar = bars.iloc[-2]
-                price_change = ((last_bar['close'] - prev_bar['close']) / prev_bar['close']) * 100
-                
-                # Format the analysis message
-                analysis = (
-                    f"📊 {symbol} Analysis:\n\n"
-                    f"Current Price: ${last_bar['close']:.2f}\n"
-                    f"Daily Change: {price_change:.2f}%\n"
-                    f"Volume: {last_bar['volume']:,}\n"
-                    f"High: ${last_bar['high']:.2f}\n"
-                    f"Low: ${last_bar['low']:.2f}\n\n"
-                    f"Want real-time updates? Use /subscribe {symbol}"
-                )
+                bars = await self.data_manager.get_historical_bars(symbol, "1D")
                 
                 # Update the message with the analysis
-                await message.edit_text(analysis)
+                await message.edit_text(self._format_analysis(symbol, bars))
                 
             except Exception as e:
                 logger.error(f"Error getting market data: {e}", exc_info=True)
                 await message.edit_text(f"Sorry, I couldn't analyze {symbol} right now.")
                 
         except Exception as e:
-            logger.error(f"Error in analyze command: {e}", exc_info=True)
-            await update.message.reply_text("Sorry, I couldn't process that command.")
+            logger.error(f"Error analyzing {symbol}: {e}", exc_info=True)
+            await reply_to.reply_text("Sorry, I couldn't process that command.")
+
+    async def _analyze_symbols(self, update: Update, symbols: List[str]) -> None:
+        """Reply with the analysis of several symbols, fetched in one request"""
+        unknown = [symbol for symbol in symbols if symbol not in self.quick_symbols]
+        if unknown:
+            await update.message.reply_text(
+                f"Sorry, I can only analyze these symbols for now: {', '.join(self.quick_symbols)}"
+            )
+            return
+        
+        message = await update.message.reply_text(f"Analyzing {', '.join(symbols)}...")
+        try:
+            frames = await self.data_manager.get_historical_bars_batch(symbols, "1D")
+            await message.edit_text("\n\n".join(self._format_analysis(symbol, frames.get(symbol)) for symbol in symbols))
+        except Exception as e:
+            logger.error(f"Error analyzing {', '.join(symbols)}: {e}", exc_info=True)
+            await message.edit_text("Sorry, I couldn't analyze those symbols right now.")
+
+    @staticmethod
+    def _format_analysis(symbol: str, bars: Optional[pd.DataFrame]) -> str:
+        """Format the daily analysis of a symbol from its recent bars"""
+        if bars is None or len(bars) < 2:
+            return f"No data available for {symbol}"
+        
+        # Calculate basic metrics
+        last_bar = bars.iloc[-1]
+        prev_bar = bars.iloc[-2]
+        price_change = ((last_bar['close'] - prev_bar['close']) / prev_bar['close']) * 100
+        
+        return ANALYSIS_TEMPLATE.format(
+            symbol=symbol,
+            close=last_bar['close'],
+            change=price_change,
+            volume=last_bar['volume'],
+            high=last_bar['high'],
+            low=last_bar['low']
+        )
 
     async def subscribe_command(self, update: Update, context: CallbackContext) -> None:
         """Subscribe to updates for a symbol"""
@@ -405,18 +516,50 @@ class BlackprintBot:
         if not self.subscribed_users:
             return
             
-        for user_id in self.subscribed_users:
+        await self._broadcast(message)
+    
+    async def _broadcast(self, message: str, **kwargs) -> None:
+        """Send a message to all subscribed users concurrently"""
+        user_ids = list(self.subscribed_users)
+        results = await asyncio.gather(
+            *(self._send_notification(user_id, message, **kwargs) for user_id in user_ids),
+            return_exceptions=True
+        )
+        for user_id, result in zip(user_ids, results):
+            if not isinstance(result, Exception):
+                continue
+            logger.error(f"Error sending notification to user {user_id}: {result}")
+            # Drop users who blocked the bot or whose chat no longer exists
+            if isinstance(result, Forbidden) or (
+                isinstance(result, BadRequest) and 'chat not found' in str(result).lower()
+            ):
+                self.subscribed_users.discard(user_id)
+
+    async def _send_notification(self, user_id: int, message: str, **kwargs) -> None:
+        """Send one notification with bounded concurrency, waiting out rate limits"""
+        for attempt in range(BROADCAST_RETRIES + 1):
             try:
-                await self.application.bot.send_message(
-                    chat_id=user_id,
-                    text=message
-                )
-            except Exception as e:
-                logger.error(f"Error sending notification to user {user_id}: {e}")
+                async with self._send_sem:
+                    await self.application.bot.send_message(chat_id=user_id, text=message, **kwargs)
+                return
+            except RetryAfter as e:
+                if attempt == BROADCAST_RETRIES:
+                    raise
+                # Sleep outside the semaphore so other sends can proceed once allowed
+                delay = e.retry_after
+                if isinstance(delay, timedelta):
+                    delay = delay.total_seconds()
+                await asyncio.sleep(delay)
 
     async def error_handler(self, update: object, context: CallbackContext) -> None:
         """Handle errors in the telegram bot"""
-        logger.error(f"Update {update} caused error: {context.error}")
+        # The error goes in as exc_info; an Update's repr is large, so it is only logged at debug level
+        logger.error("Update caused error: %s", context.error, exc_info=context.error)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Failing update: %r", update)
+        if isinstance(context.error, FATAL_ERRORS):
+            self.stop()
+            return
         if update and isinstance(update, Update) and update.effective_message:
             await update.effective_message.reply_text(
                 "Sorry, something went wrong. Please try again later."
@@ -427,30 +570,20 @@ class BlackprintBot:
         if not self.subscribed_users:
             return  # No subscribers
             
-        # Format the notification message
-        message = f"*Market Phase Change Alert*\n\n{self.market_manager.format_market_state(state)}"
+        # Format the notification message, escaping the report once for every recipient
+        report = escape_markdown(self.market_manager.format_market_state(state), version=2)
+        message = f"*Market Phase Change Alert*\n\n{report}"
         
-        # Send notification to all subscribed users
-        for user_id in self.subscribed_users:
-            try:
-                await self.application.bot.send_message(
-                    chat_id=user_id,
-                    text=message,
-                    parse_mode='Markdown'
-                )
-            except Exception as e:
-                logger.error(f"Error sending notification to user {user_id}: {e}")
-                self.subscribed_users.discard(user_id)  # Remove user if we can't send messages
+        # Send notification to all subscribed users in the background, so waiting
+        # out rate limits doesn't hold up bar processing
+        task = asyncio.create_task(self._broadcast(message, parse_mode='MarkdownV2'))
+        self._broadcast_tasks.add(task)
+        task.add_done_callback(self._broadcast_tasks.discard)
 
-    async def handle_index_callback(self, update: Update, context: CallbackContext) -> None:
-        """Handle index selection callback"""
+    async def _select_index(self, update: Update, context: CallbackContext, selected_index: str) -> None:
+        """Confirm an index chosen from the inline keyboard"""
         query = update.callback_query
-        await query.answer()  # Acknowledge the button click
-        
         try:
-            # Extract the selected index from callback data
-            selected_index = query.data.replace('index_', '')
-            
             # Send a new message with the selection
             await context.bot.send_message(
                 chat_id=query.message.chat_id,
@@ -491,11 +624,13 @@ class BlackprintBot:
             message = await update.message.reply_text(f"Getting historical data for {symbol}...")
             
             try:
-                # Get historical data
-                bars = await self.data_manager.get_historical_bars(symbol, "1Day", limit=30)
+                # Get the last HISTORICAL_DAYS daily bars
+                start = datetime.now(timezone.utc) - history_window("1D", HISTORICAL_DAYS)
+                bars = await self.data_manager.get_historical_bars(symbol, "1D", start=start)
                 if bars is None or bars.empty:
                     await message.edit_text(f"No historical data available for {symbol}")
                     return
+                bars = bars.iloc[-HISTORICAL_DAYS:]
                 
                 # Calculate basic metrics
                 last_bar = bars.iloc[-1]
@@ -506,15 +641,15 @@ class BlackprintBot:
                 avg_volume = bars['volume'].mean()
                 
                 # Format the analysis message
-                analysis = (
-                    f"📈 {symbol} Historical Analysis (30 Days):\n\n"
-                    f"Start Price: ${first_bar['close']:.2f}\n"
-                    f"End Price: ${last_bar['close']:.2f}\n"
-                    f"Total Change: {total_change:.2f}%\n"
-                    f"Average Volume: {avg_volume:,.0f}\n"
-                    f"Highest Price: ${bars['high'].max():.2f}\n"
-                    f"Lowest Price: ${bars['low'].min():.2f}\n\n"
-                    f"Want real-time updates? Use /subscribe {symbol}"
+                analysis = HISTORICAL_TEMPLATE.format(
+                    symbol=symbol,
+                    days=len(bars),
+                    start=first_bar['close'],
+                    end=last_bar['close'],
+                    change=total_change,
+                    avg_volume=avg_volume,
+                    high=bars['high'].max(),
+                    low=bars['low'].min()
                 )
                 
                 await message.edit_text(analysis)
@@ -537,26 +672,30 @@ class BlackprintBot:
                 )
                 return
             
-            timeframe = context.args[0].lower()
-            valid_timeframes = ['1m', '5m', '15m', '1h', '1d']
-            
-            if timeframe not in valid_timeframes:
-                await update.message.reply_text(
-                    f"Invalid timeframe. Please use one of: {', '.join(valid_timeframes)}"
-                )
-                return
-            
-            # Update the timeframe
-            self.data_manager.set_timeframe(timeframe)
-            
-            await update.message.reply_text(
-                f"✅ Candle timeframe set to {timeframe}"
-            )
+            await self._set_timeframe(update, context, context.args[0])
             
         except Exception as e:
             logger.error(f"Error in set_candle command: {e}", exc_info=True)
             await update.message.reply_text("Sorry, I couldn't process that command.")
 
+    async def _set_timeframe(self, update: Update, context: CallbackContext, timeframe: str) -> None:
+        """Validate and apply a candle timeframe, from a command or a button press"""
+        reply_to = update.effective_message
+        timeframe = timeframe.lower()
+        
+        if timeframe not in CANDLE_TIMEFRAMES:
+            await reply_to.reply_text(
+                f"Invalid timeframe. Please use one of: {', '.join(CANDLE_TIMEFRAMES)}"
+            )
+            return
+        
+        # Update the timeframe
+        self.data_manager.set_timeframe(timeframe)
+        
+        await reply_to.reply_text(
+            f"✅ Candle timeframe set to {timeframe}"
+        )
+
     async def set_index_command(self, update: Update, context: CallbackContext) -> None:
         """Set the market index"""
         try:
@@ -568,11 +707,10 @@ class BlackprintBot:
                 return
             
             index = context.args[0].upper()
-            valid_indices = ['SPY', 'QQQ', 'DIA']
             
-            if index not in valid_indices:
+            if index not in VALID_INDICES:
                 await update.message.reply_text(
-                    f"Invalid index. Please use one of: {', '.join(valid_indices)}"
+                    f"Invalid index. Please use one of: {', '.join(VALID_INDICES)}"
                 )
                 return
             
@@ -3,9 +3,12 @@ from typing import Dict, List, Optional, Tuple
 import pandas as pd
 import yfinance as yf
 from .market_phases import MarketPhaseDetector, PhaseDetectionConfig, MarketPhase, MarketIndex
-from strategy.indicators import calculate_emas, calculate_psar, calculate_macd
+from .indicator_state import IndicatorState
 from risk.management import RiskManager
 
+# How long fetched index data is reused before asking Yahoo again
+INDEX_DATA_TTL = pd.Timedelta(seconds=60)
+
 class TradingService:
     """
     Service to handle trading operations and strategy execution
@@ -37,7 +40,11 @@ class TradingService:
         return self.phase_detector.config.index
         
     def _fetch_index_data(self):
-        """Fetch current index data"""
+        """Fetch current index data, reusing the last fetch while it is fresh"""
+        detector = self.phase_detector
+        if detector.index_data is not None and pd.Timestamp.now() - detector.last_index_update < INDEX_DATA_TTL:
+            return detector.index_data
+        
         try:
             index_symbol = self.phase_detector.get_index_symbol()
             index = yf.Ticker(index_symbol)
@@ -64,17 +71,15 @@ class TradingService:
         index_data = self._fetch_index_data()
         
         # Detect market phase
-        phase, phase_metrics = self.phase_detector.detect_phase(data)
-        
-        # Calculate additional indicators
-        psar = calculate_psar(data['high'], data['low'])
-        macd, signal = calculate_macd(data['close'])
+        phase, phase_metrics = self.phase_detector.detect_phase(data, symbol=symbol)
         
-        # Get latest values
-        current_close = data['close'].iloc[-1]
-        current_psar = psar.iloc[-1]
-        current_macd = macd.iloc[-1]
-        current_signal = signal.iloc[-1]
+        # Only the latest indicator values are needed, so run the recurrences
+        # over the raw float64 columns instead of building indicator series
+        indicators = IndicatorState.from_bars(data)
+        current_close = float(data['close'].iat[-1])
+        current_psar = indicators.psar.sar
+        current_macd = indicators.macd
+        current_signal = indicators.macd_signal
         
         # Determine if conditions are suitable for trading
         can_trade = phase in [MarketPhase.TRENDING, MarketPhase.EMERGING]
@@ -83,9 +88,9 @@ class TradingService:
         # Calculate potential trade parameters if conditions are suitable
         trade_params = None
         if can_trade or is_pullback:
-            # For pullbacks, we want to enter in the direction of the trend
-            direction = "LONG" if data[f'ema_{self.phase_detector.config.fast_ema}'].iloc[-1] > \
-                                 data[f'ema_{self.phase_detector.config.slow_ema}'].iloc[-1] else "SHORT"
+            # For pullbacks, we want to enter in the direction of the trend,
+            # read from the latest EMAs the phase metrics already carry
+            direction = "LONG" if phase_metrics['ema_fast'] > phase_metrics['ema_slow'] else "SHORT"
             
             stop_loss = self._calculate_stop_loss(
                 direction=direction,
@@ -123,7 +128,7 @@ class TradingService:
             },
             "trade_opportunity": trade_params,
             "candle_size": self.candle_size,
-            "reference_index": self.phase_detector.config.index.name
+            "reference_index": self.phase_detector.get_index_name()
         }
         
     def _calculate_stop_loss(self, direction: str, current_price: float, psar: float) -> float:
@@ -0,0 +1,291 @@
+import asyncio
+import time
+import numpy as np
+import orjson
+import pandas as pd
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
+from bot import data_manager
+from bot.data_manager import AlpacaDataManager, BarRingBuffer, BAR_DTYPES
+
+START = pd.Timestamp('2024-01-02 14:30', tz='UTC')
+
+def _columns(first: int, count: int) -> tuple:
+    """Columns for `count` one-minute bars numbered from `first`"""
+    numbers = np.arange(first, first + count)
+    timestamps = (START + pd.to_timedelta(numbers, unit='min')).as_unit('ns').asi8
+    closes = 100.0 + numbers
+    return timestamps, closes - 0.5, closes + 1.0, closes - 1.0, closes, numbers * 10
+
+def _frame(*bars: tuple) -> bytes:
+    """A stream frame of (symbol, minute, close) bars"""
+    return orjson.dumps([
+        {'T': 'b', 'S': symbol, 't': (START + pd.Timedelta(minutes=minute)).isoformat(),
+         'o': close, 'h': close + 1.0, 'l': close - 1.0, 'c': close, 'v': 100}
+        for symbol, minute, close in bars
+    ])
+
+def _manager() -> AlpacaDataManager:
+    return AlpacaDataManager('key', 'secret', 'https://paper-api.alpaca.markets')
+
+def test_ring_keeps_last_bars_in_order():
+    """Test writes past capacity keep the most recent bars, oldest first"""
+    ring = BarRingBuffer(size=5)
+    ring.extend(*_columns(0, 3))
+    ring.extend(*_columns(3, 4))
+    assert len(ring) == 5
+
+    frame = ring.to_frame()
+    assert frame['close'].tolist() == [102.0, 103.0, 104.0, 105.0, 106.0]
+    assert frame.index.is_monotonic_increasing
+    assert frame.index[-1] == START + pd.Timedelta(minutes=6)
+    assert frame['volume'].tolist() == [20, 30, 40, 50, 60]
+
+    # A single write larger than the buffer keeps only its tail
+    ring.extend(*_columns(7, 12))
+    assert ring.to_frame()['close'].tolist() == [114.0, 115.0, 116.0, 117.0, 118.0]
+    assert ring.to_frame(2)['close'].tolist() == [117.0, 118.0]
+
+def test_latest_bars_after_wrap():
+    """Test the data manager serves the latest bars once the buffer has wrapped"""
+    manager = _manager()
+    ring = manager._ring['AAPL'] = BarRingBuffer(size=4)
+    ring.extend(*_columns(0, 3))
+    ring.extend(*_columns(3, 3))
+
+    bars = manager.get_latest_bars('AAPL')
+    assert bars['close'].tolist() == [102.0, 103.0, 104.0, 105.0]
+    assert manager.get_latest_bar('AAPL')['close'].tolist() == [105.0]
+    assert manager.get_latest_bars('MSFT') is None
+
+def test_cached_frame_rebuilt_after_write():
+    """Test the materialized window is reused until the next write"""
+    ring = BarRingBuffer(size=4)
+    ring.extend(*_columns(0, 2))
+    frame = ring.to_frame()
+    assert ring.to_frame() is frame
+
+    ring.extend(*_columns(2, 1))
+    updated = ring.to_frame()
+    assert updated is not frame
+    assert updated['close'].tolist() == [100.0, 101.0, 102.0]
+
+@pytest.mark.asyncio
+async def test_bar_volume_sent_as_float():
+    """Test a bar whose volume arrives as a JSON float is still decoded and stored"""
+    manager = _manager()
+    message = _frame(('AAPL', 0, 100.0)).replace(b'"v":100', b'"v":100.0')
+    assert data_manager.STREAM_DECODER.decode(message)[0].v == 100.0
+
+    await manager._on_message(message)
+    await manager._drain_task
+    assert manager.get_latest_bars('AAPL')['volume'].tolist() == [100]
+
+@pytest.mark.asyncio
+async def test_bursts_fold_into_one_batch_per_symbol():
+    """Test frames arriving before the drain runs are handled in one callback per symbol"""
+    manager = _manager()
+    calls = []
+
+    async def callback(symbol, bars):
+        calls.append((symbol, bars['close'].tolist()))
+    manager.add_bar_callback(callback)
+
+    await manager._on_message(_frame(('AAPL', 0, 100.0), ('MSFT', 0, 200.0)))
+    await manager._on_message(_frame(('AAPL', 1, 101.0)))
+    await manager._on_message(_frame(('MSFT', 1, 201.0), ('AAPL', 2, 102.0)))
+    await manager._drain_task
+
+    assert sorted(calls) == [('AAPL', [100.0, 101.0, 102.0]), ('MSFT', [200.0, 201.0])]
+    assert not manager._inbox
+
+@pytest.mark.asyncio
+async def test_inbox_drops_oldest_bars(monkeypatch):
+    """Test a full inbox keeps the newest bars"""
+    monkeypatch.setattr(data_manager, 'INBOX_SIZE', 3)
+    manager = _manager()
+    await manager._on_message(_frame(*(('AAPL', minute, 100.0 + minute) for minute in range(5))))
+    assert [bar.c for bar in manager._inbox] == [102.0, 103.0, 104.0]
+
+    await manager._drain_task
+    assert manager.get_latest_bars('AAPL')['close'].tolist() == [102.0, 103.0, 104.0]
+
+@pytest.mark.asyncio
+async def test_callback_error_keeps_draining():
+    """Test a failing callback neither stops other callbacks nor later bars"""
+    manager = _manager()
+    seen = []
+
+    async def failing(symbol, bars):
+        raise RuntimeError('callback failed')
+
+    async def recording(symbol, bars):
+        seen.append(bars['close'].iat[-1])
+    manager.add_bar_callback(failing)
+    manager.add_bar_callback(recording)
+
+    await manager._on_message(_frame(('AAPL', 0, 100.0)))
+    await manager._drain_task
+    assert manager._drain_task.exception() is None
+
+    await manager._on_message(_frame(('AAPL', 1, 101.0)))
+    await manager._drain_task
+    assert seen == [100.0, 101.0]
+
+@pytest.mark.asyncio
+async def test_subscribe_adds_missing_streams(monkeypatch):
+    """Test later requests for more streams of a subscribed symbol are sent"""
+    monkeypatch.setattr(data_manager, 'SUBSCRIBE_FLUSH_DELAY', 0)
+    manager = _manager()
+    manager.ws = Mock(send=AsyncMock())
+    manager.ws_running = True
+
+    await manager.subscribe_to_symbol('AAPL')
+    await manager._sub_task
+    await manager.subscribe_to_symbol('AAPL', trades=True, quotes=True)
+    await manager._sub_task
+    sent = [orjson.loads(call.args[0]) for call in manager.ws.send.call_args_list]
+    assert sent == [
+        {'action': 'subscribe', 'bars': ['AAPL']},
+        {'action': 'subscribe', 'trades': ['AAPL'], 'quotes': ['AAPL']}
+    ]
+
+    # Nothing new to request
+    await manager.subscribe_to_symbol('AAPL', trades=True)
+    await manager._sub_task
+    assert manager.ws.send.call_count == 2
+    assert manager.subscribed_streams == {'bars': {'AAPL'}, 'trades': {'AAPL'}, 'quotes': {'AAPL'}}
+
+def _hist_bar(day: int, close: float) -> SimpleNamespace:
+    return SimpleNamespace(timestamp=START + pd.Timedelta(days=day), open=close, high=close + 1.0,
+                           low=close - 1.0, close=close, volume=1000.0)
+
+@pytest.mark.asyncio
+async def test_historical_bars_batch():
+    """Test one request returns a typed frame per symbol that has bars"""
+    manager = _manager()
+    manager.hist_client = Mock()
+    manager.hist_client.get_stock_bars.return_value = SimpleNamespace(data={
+        'AAPL': [_hist_bar(0, 100.0), _hist_bar(1, 101.0)],
+        'MSFT': [_hist_bar(0, 200.0)]
+    })
+
+    frames = await manager.get_historical_bars_batch(['AAPL', 'MSFT', 'META'], '1D')
+    request = manager.hist_client.get_stock_bars.call_args[0][0]
+    assert manager.hist_client.get_stock_bars.call_count == 1
+    assert request.symbol_or_symbols == ['AAPL', 'MSFT', 'META']
+    assert sorted(frames) == ['AAPL', 'MSFT']
+    assert frames['AAPL']['close'].tolist() == [100.0, 101.0]
+    assert frames['AAPL'].index.name == 'timestamp'
+    assert frames['MSFT'].dtypes.to_dict() == {column: np.dtype(dtype) for column, dtype in BAR_DTYPES.items()}
+
+    # A single symbol goes through the same request
+    bars = await manager.get_historical_bars('AAPL', '1D', start=START)
+    assert bars['close'].tolist() == [100.0, 101.0]
+    assert manager.hist_client.get_stock_bars.call_args[0][0].symbol_or_symbols == ['AAPL']
+    assert (await manager.get_historical_bars('META', '1D', start=START)).empty
+
+@pytest.mark.asyncio
+async def test_concurrent_default_window_fetches_shared():
+    """Test concurrent default-window requests share one fetch that survives a cancelled caller"""
+    manager = _manager()
+    manager.hist_client = Mock()
+
+    def get_stock_bars(request):
+        time.sleep(0.05)  # Keep the fetch in flight while the second caller arrives
+        return SimpleNamespace(data={'AAPL': [_hist_bar(0, 100.0)]})
+    manager.hist_client.get_stock_bars.side_effect = get_stock_bars
+
+    first = asyncio.create_task(manager.get_historical_bars('AAPL', '1D'))
+    second = asyncio.create_task(manager.get_historical_bars('AAPL', '1D'))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    bars = await second
+    assert first.cancelled()
+    assert bars['close'].tolist() == [100.0]
+    assert manager.hist_client.get_stock_bars.call_count == 1
+    assert not manager._bars_pending
+
+class _FakeSocket:
+    """Connection that records what was sent and closes after its messages"""
+
+    def __init__(self, manager, messages=(), last=False):
+        self.manager = manager
+        self.messages = list(messages)
+        self.last = last
+        self.transport = None
+        self.sent = []
+
+    async def send(self, payload):
+        self.sent.append(orjson.loads(payload))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.messages:
+            return self.messages.pop(0)
+        if self.last:
+            self.manager.ws_running = False
+        raise StopAsyncIteration
+
+@pytest.mark.asyncio
+async def test_reconnect_restores_subscriptions(monkeypatch):
+    """Test a reconnect backs off and subscribes to every stream again"""
+    manager = _manager()
+    manager.subscribed_streams = {'bars': {'AAPL', 'MSFT'}, 'trades': {'AAPL'}}
+    first, second = _FakeSocket(manager), _FakeSocket(manager, last=True)
+    attempts = [first, OSError('connection refused'), second]
+
+    def connect(endpoint, ssl):
+        attempt = attempts.pop(0)
+        if isinstance(attempt, Exception):
+            raise attempt
+        return attempt
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+    monkeypatch.setattr(data_manager.websockets, 'connect', connect)
+    monkeypatch.setattr(data_manager.random, 'uniform', lambda low, high: 0.0)
+    monkeypatch.setattr(data_manager.asyncio, 'sleep', sleep)
+
+    manager.ws_running = True
+    await manager._ws_loop()
+
+    assert delays == [10, 20]  # Quick failures double the delay
+    expected = {'action': 'subscribe', 'bars': ['AAPL', 'MSFT', 'SPY'], 'trades': ['AAPL']}
+    for socket in (first, second):
+        assert socket.sent[0]['action'] == 'auth'
+        assert socket.sent[1] == expected
+
+@pytest.mark.asyncio
+async def test_failed_subscribe_stays_queued(monkeypatch):
+    """Test subscriptions that couldn't be sent aren't recorded, and go out on the next connection"""
+    monkeypatch.setattr(data_manager, 'SUBSCRIBE_FLUSH_DELAY', 0)
+    manager = _manager()
+    manager.ws = Mock(send=AsyncMock(side_effect=ConnectionError('socket closed')))
+    manager.ws_running = True
+
+    await manager.subscribe_to_symbol('AAPL', trades=True)
+    await manager._sub_task
+    assert manager.subscribed_streams == {}
+    assert manager._pending_subs == {'bars': {'AAPL'}, 'trades': {'AAPL'}}
+
+    socket = _FakeSocket(manager)
+    manager.ws = socket
+    await manager._on_open(socket)
+    await manager._sub_task
+    assert socket.sent[-1] == {'action': 'subscribe', 'bars': ['AAPL'], 'trades': ['AAPL']}
+    assert manager.subscribed_streams == {'bars': {'AAPL'}, 'trades': {'AAPL'}}
+    assert not manager._pending_subs
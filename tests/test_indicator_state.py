@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+from bot.indicator_state import IndicatorState, EMA_PERIODS
+
+@pytest.fixture
+def bars():
+    rng = np.random.default_rng(7)
+    close = 100 + rng.normal(0, 1, 300).cumsum()
+    index = pd.date_range(start='2024-01-02 09:30', periods=300, freq='15min')
+    return pd.DataFrame({
+        'open': close,
+        'high': close + rng.uniform(0.1, 1.0, 300),
+        'low': close - rng.uniform(0.1, 1.0, 300),
+        'close': close,
+        'volume': 1000.0
+    }, index=index)
+
+def test_emas_match_pandas(bars):
+    """Test EMA and MACD values match pandas ewm"""
+    state = IndicatorState.from_bars(bars)
+    for period in EMA_PERIODS:
+        expected = bars['close'].ewm(span=period, adjust=False).mean().iloc[-1]
+        assert state.emas[period] == pytest.approx(expected, rel=1e-12)
+
+    fast = bars['close'].ewm(span=12, adjust=False).mean()
+    slow = bars['close'].ewm(span=26, adjust=False).mean()
+    signal = (fast - slow).ewm(span=9, adjust=False).mean()
+    assert state.macd == pytest.approx(fast.iloc[-1] - slow.iloc[-1], rel=1e-9)
+    assert state.macd_signal == pytest.approx(signal.iloc[-1], rel=1e-9)
+
+def test_update_matches_full_recompute(bars):
+    """Test advancing bar by bar gives the same state as a full pass"""
+    state = IndicatorState.from_bars(bars.iloc[:200])
+    for end in (201, 205, 300):
+        assert state.update(bars.iloc[:end])
+
+    full = IndicatorState.from_bars(bars)
+    assert state.timestamp == full.timestamp
+    for period in EMA_PERIODS:
+        assert state.emas[period] == pytest.approx(full.emas[period], rel=1e-12)
+    assert state.macd == pytest.approx(full.macd, rel=1e-9)
+    assert state.macd_signal == pytest.approx(full.macd_signal, rel=1e-9)
+    assert state.psar == full.psar
+
+def test_update_requires_last_bar(bars):
+    """Test update refuses frames that no longer contain the last processed bar"""
+    state = IndicatorState.from_bars(bars.iloc[:100])
+    assert not state.update(bars.iloc[150:])
+
+def test_psar_stays_outside_bar_range(bars):
+    """Test the SAR sits below the bar in uptrends and above it in downtrends"""
+    state = IndicatorState.from_bars(bars.iloc[:2])
+    for i in range(2, len(bars)):
+        state.update(bars.iloc[:i + 1])
+        bar = bars.iloc[i]
+        if state.psar.rising:
+            assert state.psar.sar <= bar['low']
+        else:
+            assert state.psar.sar >= bar['high']
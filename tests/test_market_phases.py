@@ -1,7 +1,7 @@
 import unittest
 import pandas as pd
 import numpy as np
-from bot.market_phases import MarketPhaseDetector, PhaseDetectionConfig, MarketPhase
+from bot.market_phases import MarketPhaseDetector, PhaseDetectionConfig, MarketPhase, calculate_ema, calculate_triple_ema
 
 class TestMarketPhaseDetector(unittest.TestCase):
     def setUp(self):
@@ -145,6 +145,90 @@ class TestMarketPhaseDetector(unittest.TestCase):
         print(metrics)
         self.assertEqual(phase, MarketPhase.PULLBACK)
         
+    def test_calculate_slope(self):
+        """Test slope matches a least-squares line fit"""
+        series = pd.Series([100.0, 100.4, 100.3, 101.1, 101.6, 102.4, 102.2])
+        expected = np.polyfit(np.arange(5), series.iloc[-5:].values, 1)[0]
+        self.assertAlmostEqual(self.detector.calculate_slope(series), expected, places=10)
+        self.assertEqual(self.detector.calculate_slope(pd.Series([5.0] * 10)), 0.0)
+        self.assertEqual(self.detector.calculate_slope(pd.Series([1.0, 2.0])), 0.0)
+        
+    def test_calculate_slopes_batch(self):
+        """Test batched slopes match the per-series calculation"""
+        df = self.detector.calculate_emas(self.sample_data)
+        config = self.detector.config
+        series = [df[f'ema_{span}'] for span in (config.fast_ema, config.medium_ema, config.slow_ema)]
+        batched = self.detector.calculate_slopes_batch(*series)
+        for value, s in zip(batched, series):
+            self.assertAlmostEqual(value, self.detector.calculate_slope(s), places=10)
+        
+    def test_calculate_triple_ema(self):
+        """Test the fused EMA pass matches per-span EMAs and pandas"""
+        close = self.sample_data['close'].to_numpy()
+        spans = (13, 34, 89)
+        for span, ema in zip(spans, calculate_triple_ema(close, spans)):
+            np.testing.assert_array_equal(ema, calculate_ema(close, span))
+            expected = self.sample_data['close'].ewm(span=span, adjust=False).mean().to_numpy()
+            np.testing.assert_allclose(ema, expected, rtol=1e-12)
+
+    def test_ema_arrays_for_sliding_window(self):
+        """Test EMAs of a sliding window don't depend on the frames seen before it"""
+        spans = (13, 34, 89)
+        for start in range(0, 40, 5):
+            window = self.sample_data.iloc[start:start + 60]
+            emas = self.detector.calculate_ema_arrays(window, symbol='AAPL')
+            expected = calculate_triple_ema(window['close'].to_numpy(), spans)
+            for ema, expected_ema in zip(emas.values(), expected):
+                np.testing.assert_allclose(ema, expected_ema, rtol=1e-12)
+
+    def test_ema_arrays_for_appended_bars(self):
+        """Test appending bars continues the symbol's EMAs with the same result"""
+        spans = (13, 34, 89)
+        self.detector.calculate_ema_arrays(self.sample_data.iloc[:70], symbol='AAPL')
+        self.detector.calculate_ema_arrays(self.sample_data.iloc[10:50], symbol='MSFT')
+        emas = self.detector.calculate_ema_arrays(self.sample_data, symbol='AAPL')
+        expected = calculate_triple_ema(self.sample_data['close'].to_numpy(), spans)
+        for ema, expected_ema in zip(emas.values(), expected):
+            np.testing.assert_allclose(ema, expected_ema, rtol=1e-12)
+        self.assertEqual(set(self.detector._ema_state), {'AAPL', 'MSFT'})
+
+    def test_detect_phase_from_emas(self):
+        """Test phase detection from caller-maintained EMAs matches detect_phase"""
+        df = self.detector.calculate_emas(self.sample_data)
+        config = self.detector.config
+        phase, metrics = self.detector.detect_phase(self.sample_data)
+        array_phase, array_metrics = self.detector.detect_phase_from_emas(
+            df['close'].to_numpy(),
+            *(df[f'ema_{span}'].to_numpy() for span in (config.fast_ema, config.medium_ema, config.slow_ema))
+        )
+        self.assertEqual(array_phase, phase)
+        self.assertEqual(array_metrics, metrics)
+        
+    def test_detect_phase_cached_by_symbol(self):
+        """Test repeat detection for the same symbol and bar reuses the result"""
+        phase, metrics = self.detector.detect_phase(self.sample_data, symbol='AAPL')
+        metrics['detected_phase'] = 'changed'  # Callers get their own copy
+        
+        cached_phase, cached_metrics = self.detector.detect_phase(self.sample_data.copy(), symbol='AAPL')
+        self.assertEqual(cached_phase, phase)
+        self.assertEqual(cached_metrics, self.detector.detect_phase(self.sample_data)[1])
+        self.assertEqual(len(self.detector._phase_cache), 1)
+        
+        # A new last close is a new bar state
+        changed = self.sample_data.copy()
+        changed.iloc[-1, changed.columns.get_loc('close')] += 1.0
+        _, changed_metrics = self.detector.detect_phase(changed, symbol='AAPL')
+        self.assertEqual(changed_metrics, self.detector.detect_phase(changed)[1])
+
+    def test_detect_phase_cache_compares_closes(self):
+        """Test frames with the same endpoints but different interior closes don't share a result"""
+        self.detector.detect_phase(self.sample_data, symbol='AAPL')
+
+        changed = self.sample_data.copy()
+        changed.iloc[40:90, changed.columns.get_loc('close')] += 5.0
+        _, metrics = self.detector.detect_phase(changed, symbol='AAPL')
+        self.assertEqual(metrics, MarketPhaseDetector().detect_phase(changed)[1])
+        
     def test_candle_size_config(self):
         """Test candle size configuration"""
         detector = MarketPhaseDetector(config=PhaseDetectionConfig(candle_size="1H"))
@@ -0,0 +1,150 @@
+import asyncio
+import numpy as np
+import orjson
+import pandas as pd
+import pytest
+from unittest.mock import AsyncMock, Mock
+from bot.market_phases import MarketPhase, calculate_triple_ema
+from bot.market_state import MarketStateManager, MarketStateStore, METRIC_FIELDS, CANDLE_MINUTES, HISTORICAL_BARS, history_window
+
+def _values(offset: float) -> dict:
+    return {field: offset + i for i, field in enumerate(METRIC_FIELDS)}
+
+def test_store_round_trip():
+    """Test stored metrics come back as the same MarketMetrics"""
+    store = MarketStateStore()
+    timestamp = pd.Timestamp('2024-01-02 15:30', tz='UTC')
+    assert store.update('AAPL', timestamp, MarketPhase.TRENDING, _values(100.0))
+
+    metrics = store.materialize('AAPL', '15Min')
+    assert metrics.timestamp == timestamp
+    assert metrics.phase == MarketPhase.TRENDING
+    assert metrics.symbol == 'AAPL'
+    assert metrics.candle_size == '15Min'
+    for field, value in _values(100.0).items():
+        assert getattr(metrics, field) == value
+    assert store.materialize('MSFT', '15Min') is None
+
+def test_metrics_to_json():
+    """Test JSON serialization keeps every field"""
+    store = MarketStateStore()
+    timestamp = pd.Timestamp('2024-01-02 15:30', tz='UTC')
+    store.update('AAPL', timestamp, MarketPhase.TRENDING, _values(100.0))
+    data = orjson.loads(store.materialize('AAPL', '15Min').to_json())
+
+    assert data['timestamp'] == timestamp.isoformat()
+    assert data['phase'] == MarketPhase.TRENDING.value
+    assert data['symbol'] == 'AAPL'
+    for field, value in _values(100.0).items():
+        assert data[field] == value
+
+def test_store_phase_changes():
+    """Test update reports phase changes only"""
+    store = MarketStateStore()
+    timestamp = pd.Timestamp('2024-01-02 15:30')
+    assert store.update('AAPL', timestamp, MarketPhase.EMERGING, _values(1.0))
+    assert not store.update('AAPL', timestamp, MarketPhase.EMERGING, _values(2.0))
+    assert store.update('AAPL', timestamp, MarketPhase.TRENDING, _values(3.0))
+    assert store.phase('AAPL') == MarketPhase.TRENDING
+    assert store.materialize('AAPL', '15Min').ema_5 == 3.0
+
+def test_store_grows():
+    """Test columns grow past the initial capacity"""
+    store = MarketStateStore(capacity=2)
+    timestamp = pd.Timestamp('2024-01-02 15:30')
+    symbols = [f'SYM{i}' for i in range(5)]
+    for i, symbol in enumerate(symbols):
+        store.update(symbol, timestamp, MarketPhase.UNORDERED, _values(float(i)))
+
+    assert len(store) == 5
+    assert store.symbols == symbols
+    assert list(store.column('ema_5')) == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert store.materialize('SYM0', '15Min').ema_89 == 6.0
+
+def test_history_window_covers_enough_bars():
+    """Test the fetch window spans enough weekday sessions for the EMAs"""
+    end = pd.Timestamp('2024-01-08 09:45')  # Monday morning, right after a weekend
+    for candle_size, minutes in CANDLE_MINUTES.items():
+        days = pd.bdate_range(end - history_window(candle_size), end.normalize() - pd.Timedelta(days=1))
+        assert len(days) * 390 // minutes >= HISTORICAL_BARS, candle_size
+    assert history_window('1D') > history_window('1Min')
+
+def _bars(close: np.ndarray) -> pd.DataFrame:
+    index = pd.date_range(start='2024-01-02 14:30', periods=len(close), freq='1min', tz='UTC', name='timestamp')
+    return pd.DataFrame({'open': close, 'high': close + 0.5, 'low': close - 0.5, 'close': close,
+                         'volume': 1000}, index=index)
+
+@pytest.mark.asyncio
+async def test_live_updates_keep_ema_state_per_symbol():
+    """Test interleaved live bars for two symbols each continue their own EMAs"""
+    rng = np.random.default_rng(3)
+    closes = {'AAPL': 100 + rng.normal(0, 1, 120).cumsum(), 'MSFT': 300 + rng.normal(0, 1, 120).cumsum()}
+    frames = {}
+    data_manager = Mock()
+    data_manager.get_latest_bars.side_effect = lambda symbol: frames[symbol]
+    manager = MarketStateManager(data_manager)
+
+    for count in range(100, 121):
+        for symbol, close in closes.items():
+            frames[symbol] = _bars(close[:count])
+            await manager._handle_market_update(symbol, frames[symbol])
+
+    detector = manager.detector
+    assert set(detector._ema_state) == {'AAPL', 'MSFT'}
+    assert {key[0] for key in detector._phase_cache} == {'AAPL', 'MSFT'}
+    for symbol, close in closes.items():
+        _, state_close, spans, emas = detector._ema_state[symbol]
+        np.testing.assert_array_equal(state_close, close)
+        for ema, expected in zip(emas, calculate_triple_ema(close, spans)):
+            np.testing.assert_allclose(ema, expected, rtol=1e-12)
+        assert manager.get_current_state(symbol).timestamp == frames[symbol].index[-1]
+
+def _history_manager(delay: float = 0.0) -> MarketStateManager:
+    """Manager whose data manager returns the same bars for any historical query"""
+    data_manager = Mock()
+    bars = _bars(100 + np.random.default_rng(5).normal(0, 1, HISTORICAL_BARS).cumsum())
+
+    async def get_historical_bars(**kwargs):
+        await asyncio.sleep(delay)
+        return bars
+    data_manager.get_historical_bars = AsyncMock(side_effect=get_historical_bars)
+    return MarketStateManager(data_manager)
+
+@pytest.mark.asyncio
+async def test_historical_state_cached():
+    """Test a repeat query in the same minute is served from the cache with its own timestamp"""
+    manager = _history_manager()
+    timestamp = pd.Timestamp('2024-01-02 16:00:05', tz='UTC')
+    state = await manager.get_historical_state('AAPL', timestamp)
+    later = timestamp + pd.Timedelta(seconds=30)
+    cached = await manager.get_historical_state('AAPL', later)
+
+    assert manager.data_manager.get_historical_bars.await_count == 1
+    assert state.timestamp == timestamp
+    assert cached.timestamp == later
+    assert cached.phase == state.phase and cached.ema_89 == state.ema_89
+
+@pytest.mark.asyncio
+async def test_recent_historical_state_not_cached():
+    """Test states new bars can still change are computed each time"""
+    manager = _history_manager()
+    timestamp = pd.Timestamp.now(tz='UTC').floor('min')
+    await manager.get_historical_state('AAPL', timestamp)
+    await manager.get_historical_state('AAPL', timestamp)
+
+    assert manager.data_manager.get_historical_bars.await_count == 2
+    assert not manager._historical_cache
+
+@pytest.mark.asyncio
+async def test_concurrent_historical_queries_share_computation():
+    """Test concurrent queries for the same state wait on one computation"""
+    manager = _history_manager(delay=0.05)
+    timestamp = pd.Timestamp('2024-01-02 16:00', tz='UTC')
+    states = await asyncio.gather(
+        manager.get_historical_state('AAPL', timestamp),
+        manager.get_historical_state('AAPL', timestamp + pd.Timedelta(seconds=10))
+    )
+
+    assert manager.data_manager.get_historical_bars.await_count == 1
+    assert [state.timestamp for state in states] == [timestamp, timestamp + pd.Timedelta(seconds=10)]
+    assert not manager._historical_pending
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import pytest
+from bot import subscribers
+from bot.subscribers import SubscriberStore
+
+def open_store(path):
+    store = SubscriberStore(path)
+    store.open()
+    return store
+
+def test_store_persists_changes(tmp_path):
+    """Test subscriptions survive reopening the database"""
+    path = str(tmp_path / 'data' / 'subscribers.db')
+    store = open_store(path)
+    store.add(1)
+    store.add(2)
+    store.add(3)
+    store.discard(2)
+    assert 1 in store and 2 not in store
+    store.close()
+
+    reopened = open_store(path)
+    assert sorted(reopened) == [1, 3]
+    assert len(reopened) == 2
+    reopened.close()
+
+def test_store_opens_lazily(tmp_path):
+    """Test creating a store doesn't touch the disk until it is opened"""
+    path = tmp_path / 'data' / 'subscribers.db'
+    store = SubscriberStore(str(path))
+    assert not os.path.exists(path.parent)
+    store.close()
+
+    store.open()
+    assert path.exists()
+    store.close()
+
+def test_in_memory_store():
+    """Test an in-memory database works for throwaway stores"""
+    store = open_store(':memory:')
+    store.add(1)
+    store.flush()
+    assert list(store) == [1]
+    store.close()
+
+def test_changes_are_queued_until_flush(tmp_path):
+    """Test reads come from memory while writes wait for a flush"""
+    path = str(tmp_path / 'subscribers.db')
+    store = open_store(path)
+    store.add(1)
+    assert len(open_store(path)) == 0
+
+    store.flush()
+    assert sorted(open_store(path)) == [1]
+    store.close()
+
+@pytest.mark.asyncio
+async def test_run_writes_changes_in_batches(tmp_path, monkeypatch):
+    """Test the background writer flushes after the batching delay"""
+    monkeypatch.setattr(subscribers, 'FLUSH_DELAY', 0.01)
+    path = str(tmp_path / 'subscribers.db')
+    store = open_store(path)
+    task = asyncio.create_task(store.run())
+    store.add(1)
+    store.add(2)
+    await asyncio.sleep(0.1)
+    assert sorted(open_store(path)) == [1, 2]
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    store.close()
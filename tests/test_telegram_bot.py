@@ -1,10 +1,15 @@
+import asyncio
 import pytest
 from unittest.mock import Mock, patch, AsyncMock, MagicMock
 from telegram import Update, Message, Chat, User, InlineKeyboardMarkup, ReplyKeyboardMarkup
 from telegram.ext import Application, ContextTypes
-from bot.telegram_bot import BlackprintBot
+from telegram.error import RetryAfter
+from bot.telegram_bot import BlackprintBot, BROADCAST_RETRIES, HISTORICAL_DAYS
 from bot.market_phases import MarketIndex, MarketPhase
+from bot.subscribers import SubscriberStore
 from datetime import datetime
+import numpy as np
+import pandas as pd
 import pytz
 
 @pytest.fixture
@@ -32,9 +37,10 @@ def mock_market_state():
     return mock_state
 
 @pytest.fixture
-def bot(mock_alpaca_data, mock_market_state):
+def bot(mock_alpaca_data, mock_market_state, monkeypatch):
     """Create a bot instance for testing"""
     token = "test_token"
+    monkeypatch.setenv('SUBSCRIBERS_DB', ':memory:')
     with patch('telegram.ext.Application.builder') as mock_builder:
         mock_app = Mock()
         mock_builder.return_value.token.return_value.build.return_value = mock_app
@@ -210,3 +216,140 @@ async def test_set_index_command_with_buttons(bot, update, context):
     update.message.reply_text.assert_called_once()
     call_kwargs = update.message.reply_text.call_args[1]
     assert isinstance(call_kwargs['reply_markup'], InlineKeyboardMarkup)
+
+def _daily_bars(count: int) -> pd.DataFrame:
+    close = 100.0 + np.arange(count, dtype=np.float64)
+    index = pd.date_range(end='2024-03-01', periods=count, freq='B', tz='UTC', name='timestamp')
+    return pd.DataFrame({'open': close, 'high': close + 1.0, 'low': close - 1.0, 'close': close,
+                         'volume': 1000}, index=index)
+
+@pytest.fixture
+def analysis_bot(monkeypatch):
+    """Bot with a mocked data manager"""
+    monkeypatch.setenv('SUBSCRIBERS_DB', ':memory:')
+    bot = BlackprintBot()
+    bot.data_manager = Mock()
+    bot.data_manager.get_historical_bars = AsyncMock(return_value=_daily_bars(40))
+    bot.data_manager.get_historical_bars_batch = AsyncMock(
+        return_value={'AAPL': _daily_bars(5), 'MSFT': _daily_bars(5)}
+    )
+    return bot
+
+@pytest.mark.asyncio
+async def test_analyze_several_symbols(analysis_bot, update, context):
+    """Test /analyze with several symbols fetches them in one request and replies once"""
+    message = Mock(edit_text=AsyncMock())
+    update.message.reply_text = AsyncMock(return_value=message)
+    context.args = ['aapl', 'MSFT', 'AAPL', 'meta']
+    await analysis_bot.analyze_stock(update, context)
+
+    analysis_bot.data_manager.get_historical_bars_batch.assert_awaited_once_with(['AAPL', 'MSFT', 'META'], '1D')
+    reply = message.edit_text.call_args[0][0]
+    assert 'AAPL' in reply and 'MSFT' in reply
+    assert 'No data available for META' in reply
+
+@pytest.mark.asyncio
+async def test_analyze_several_symbols_rejects_unknown(analysis_bot, update, context):
+    """Test /analyze with an unsupported symbol replies without fetching"""
+    context.args = ['AAPL', 'XYZ']
+    await analysis_bot.analyze_stock(update, context)
+
+    analysis_bot.data_manager.get_historical_bars_batch.assert_not_awaited()
+    assert 'only analyze' in update.message.reply_text.call_args[0][0]
+
+@pytest.mark.asyncio
+async def test_historical_command(analysis_bot, update, context):
+    """Test /historical summarizes the last HISTORICAL_DAYS daily bars"""
+    message = Mock(edit_text=AsyncMock())
+    update.message.reply_text = AsyncMock(return_value=message)
+    context.args = ['aapl']
+    await analysis_bot.historical_command(update, context)
+
+    args, kwargs = analysis_bot.data_manager.get_historical_bars.call_args
+    assert args == ('AAPL', '1D')
+    assert kwargs['start'].tzinfo is not None
+    reply = message.edit_text.call_args[0][0]
+    assert f'({HISTORICAL_DAYS} Days)' in reply
+    assert 'Start Price: $110.00' in reply  # The 30 most recent of 40 bars
+    assert 'End Price: $139.00' in reply
+
+@pytest.mark.asyncio
+async def test_cleanup_stops_polling_first(analysis_bot):
+    """Test cleanup stops the updater before shutting the application down"""
+    order = []
+    application = Mock(running=True)
+    application.updater = Mock(running=True)
+    application.updater.stop = AsyncMock(side_effect=lambda: order.append('updater'))
+    application.stop = AsyncMock(side_effect=lambda: order.append('stop'))
+    application.shutdown = AsyncMock(side_effect=lambda: order.append('shutdown'))
+    analysis_bot.application = application
+    analysis_bot.data_manager = None  # Cleanup after a failed initialize()
+
+    await analysis_bot.cleanup()
+    assert order == ['updater', 'stop', 'shutdown']
+
+@pytest.mark.asyncio
+async def test_cleanup_saves_subscribers_when_shutdown_fails(analysis_bot, tmp_path):
+    """Test queued subscriber changes are written even if stopping the application raises"""
+    path = str(tmp_path / 'subscribers.db')
+    analysis_bot.subscribed_users = SubscriberStore(path)
+    analysis_bot.subscribed_users.open()
+    analysis_bot.subscribed_users.add(123)
+    analysis_bot.application = Mock(running=True, updater=None)
+    analysis_bot.application.stop = AsyncMock(side_effect=RuntimeError('stop failed'))
+    analysis_bot.data_manager = None
+
+    with pytest.raises(RuntimeError):
+        await analysis_bot.cleanup()
+    saved = SubscriberStore(path)
+    saved.open()
+    assert list(saved) == [123]
+    saved.close()
+
+@pytest.mark.asyncio
+async def test_send_notification_retries_after_rate_limit(analysis_bot):
+    """Test a rate-limited send is retried, and gives up after BROADCAST_RETRIES"""
+    analysis_bot.application = Mock()
+    send_message = analysis_bot.application.bot.send_message = AsyncMock(
+        side_effect=[RetryAfter(0), RetryAfter(0), None]
+    )
+    await analysis_bot._send_notification(123, 'alert')
+    assert send_message.await_count == 3
+
+    send_message.side_effect = RetryAfter(0)
+    send_message.reset_mock()
+    with pytest.raises(RetryAfter):
+        await analysis_bot._send_notification(123, 'alert')
+    assert send_message.await_count == BROADCAST_RETRIES + 1
+
+@pytest.mark.asyncio
+async def test_phase_change_broadcast_runs_in_background(analysis_bot):
+    """Test a phase change alert doesn't wait for the sends to finish"""
+    release = asyncio.Event()
+
+    async def send_message(**kwargs):
+        await release.wait()
+    analysis_bot.application = Mock()
+    analysis_bot.application.bot.send_message = AsyncMock(side_effect=send_message)
+    analysis_bot.market_manager = Mock(format_market_state=Mock(return_value='report'))
+    analysis_bot.subscribed_users.add(123)
+
+    await analysis_bot._handle_phase_change('AAPL', Mock())
+    (task,) = analysis_bot._broadcast_tasks
+    assert not task.done()
+
+    release.set()
+    await task
+    assert analysis_bot.application.bot.send_message.await_args.kwargs['chat_id'] == 123
+    assert not analysis_bot._broadcast_tasks
+
+@pytest.mark.asyncio
+async def test_timeframe_button_accepted(analysis_bot, update, context):
+    """Test pressing a timeframe button applies that timeframe"""
+    button = analysis_bot.get_timeframe_keyboard().inline_keyboard[0][0]
+    update.callback_query = Mock(data=button.callback_data, answer=AsyncMock())
+    update.effective_message = update.message
+    await analysis_bot.button_callback(update, context)
+
+    analysis_bot.data_manager.set_timeframe.assert_called_once_with(button.text)
+    assert 'set to' in update.message.reply_text.call_args[0][0]